@@ -0,0 +1,280 @@
+import asyncio
+import json
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional, Union
+
+from aimakerspace.lexical import BM25Index
+
+if TYPE_CHECKING:
+    from aimakerspace.vectordatabase import VectorDatabase
+
+
+@dataclass
+class DocumentSession:
+    """An uploaded document whose chunks have already been embedded."""
+
+    document_id: str
+    filename: str
+    database: "VectorDatabase"
+    created_at: float = field(default_factory=time.time)
+    last_access: float = field(default_factory=time.time)
+    _lexical_index: Optional[BM25Index] = field(default=None, repr=False, compare=False)
+
+    @property
+    def lexical_index(self) -> BM25Index:
+        """BM25 index over the session's chunks, built on first use."""
+
+        if self._lexical_index is None:
+            self._lexical_index = BM25Index.from_texts(self.database.keys())
+        return self._lexical_index
+
+
+class InMemoryDocumentBackend:
+    """Keep sessions in a process-local dictionary."""
+
+    def __init__(self):
+        self._sessions: Dict[str, DocumentSession] = {}
+
+    def save(self, session: DocumentSession) -> None:
+        self._sessions[session.document_id] = session
+
+    def load(self, document_id: str) -> Optional[DocumentSession]:
+        return self._sessions.get(document_id)
+
+    def touch(self, session: DocumentSession) -> None:
+        """Persist ``session.last_access``; a no-op for in-memory sessions."""
+
+    def delete(self, document_id: str) -> None:
+        self._sessions.pop(document_id, None)
+
+    def last_accesses(self) -> Dict[str, float]:
+        """Return ``{document_id: last_access}`` for every stored session."""
+
+        return {
+            document_id: session.last_access
+            for document_id, session in list(self._sessions.items())
+        }
+
+
+class DiskDocumentBackend:
+    """Persist each session as a ``VectorDatabase.save`` directory.
+
+    Sessions survive restarts and are shared by every worker that points at
+    the same ``directory``; vectors are memory-mapped when loaded. Up to
+    ``max_cached`` loaded sessions are kept per process, so repeated loads
+    only re-read the small ``session.json`` and keep their BM25 index.
+    """
+
+    _SESSION_FILE = "session.json"
+
+    def __init__(self, directory: Union[str, Path], max_cached: int = 16):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_cached = max_cached
+        self._cache: "OrderedDict[str, DocumentSession]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def save(self, session: DocumentSession) -> None:
+        path = self._path(session.document_id)
+        session.database.save(path)
+        self._write_session_file(path, session)
+        self._remember(session)
+
+    def load(self, document_id: str) -> Optional[DocumentSession]:
+        path = self._path(document_id)
+        info = self._read_session_file(path)
+        if info is None:
+            # Deleted, possibly by another worker.
+            with self._cache_lock:
+                self._cache.pop(document_id, None)
+            return None
+
+        with self._cache_lock:
+            session = self._cache.get(document_id)
+            if session is not None:
+                self._cache.move_to_end(document_id)
+        if session is None:
+            from aimakerspace.vectordatabase import VectorDatabase
+
+            session = DocumentSession(
+                document_id=document_id,
+                filename=info["filename"],
+                database=VectorDatabase.load(path, mmap=True),
+                created_at=info["created_at"],
+            )
+            self._remember(session)
+        # Other workers may have used the session since it was cached.
+        session.last_access = max(session.last_access, info["last_access"])
+        return session
+
+    def touch(self, session: DocumentSession) -> None:
+        self._write_session_file(self._path(session.document_id), session)
+
+    def delete(self, document_id: str) -> None:
+        with self._cache_lock:
+            self._cache.pop(document_id, None)
+        shutil.rmtree(self._path(document_id), ignore_errors=True)
+
+    def last_accesses(self) -> Dict[str, float]:
+        """Return ``{document_id: last_access}`` for every session on disk.
+
+        This scans ``directory``, so it also sees sessions written by other
+        workers.
+        """
+
+        accesses: Dict[str, float] = {}
+        for path in self.directory.iterdir():
+            if not path.name.isalnum():
+                continue
+            info = self._read_session_file(path)
+            if info is not None:
+                accesses[path.name] = info["last_access"]
+        return accesses
+
+    def _remember(self, session: DocumentSession) -> None:
+        with self._cache_lock:
+            self._cache[session.document_id] = session
+            self._cache.move_to_end(session.document_id)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+
+    def _path(self, document_id: str) -> Path:
+        # Ids are generated as uuid4 hex; reject anything else so a crafted id
+        # cannot escape ``self.directory``.
+        if not document_id.isalnum():
+            raise ValueError(f"Invalid document id: {document_id!r}")
+        return self.directory / document_id
+
+    def _read_session_file(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with (path / self._SESSION_FILE).open("r", encoding="utf-8") as file_handle:
+                return json.load(file_handle)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+    def _write_session_file(self, path: Path, session: DocumentSession) -> None:
+        # Written atomically: other workers read it concurrently.
+        from aimakerspace.vectordatabase import _write_atomic
+
+        info = {
+            "filename": session.filename,
+            "created_at": session.created_at,
+            "last_access": session.last_access,
+        }
+        _write_atomic(
+            path / self._SESSION_FILE,
+            lambda handle: handle.write(json.dumps(info).encode("utf-8")),
+        )
+
+
+class DocumentStore:
+    """Document-id keyed sessions with idle-time (TTL) eviction.
+
+    Chunks are embedded once at upload and kept in a ``VectorDatabase``, so
+    each chat message only embeds the query. Sessions idle for longer than
+    ``ttl_seconds`` are dropped, and at most ``max_documents`` are kept
+    (least recently used first). Eviction looks at every session in the
+    backend, including those other workers wrote to a shared directory; it
+    runs on every :meth:`put` and at most every ``sweep_interval`` seconds
+    on :meth:`get`.
+
+    Backend I/O happens outside the store's lock. From async code use
+    :meth:`aput` and :meth:`aget`, which run it in the default executor.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[Union[InMemoryDocumentBackend, DiskDocumentBackend]] = None,
+        ttl_seconds: float = 3600.0,
+        max_documents: int = 100,
+        sweep_interval: float = 60.0,
+    ):
+        self.backend = backend or InMemoryDocumentBackend()
+        self.ttl_seconds = ttl_seconds
+        self.max_documents = max_documents
+        self.sweep_interval = sweep_interval
+        self._swept_at = 0.0
+        self._lock = threading.Lock()
+
+    def put(self, database: "VectorDatabase", filename: str) -> str:
+        """Store ``database`` as a new session and return its document id."""
+
+        session = DocumentSession(uuid.uuid4().hex, filename, database)
+        self.backend.save(session)
+        self._evict(time.time(), force=True)
+        return session.document_id
+
+    def get(self, document_id: str) -> Optional[DocumentSession]:
+        """Return the live session for ``document_id`` and refresh its TTL."""
+
+        now = time.time()
+        self._evict(now)
+        try:
+            session = self.backend.load(document_id)
+        except ValueError:
+            return None
+        if session is None:
+            return None
+        if now - session.last_access > self.ttl_seconds:
+            self.backend.delete(document_id)
+            return None
+
+        session.last_access = now
+        self.backend.touch(session)
+        return session
+
+    async def aput(self, database: "VectorDatabase", filename: str) -> str:
+        """:meth:`put` in the default executor, off the event loop."""
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.put, database, filename)
+
+    async def aget(self, document_id: str) -> Optional[DocumentSession]:
+        """:meth:`get` in the default executor, off the event loop."""
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get, document_id)
+
+    def delete(self, document_id: str) -> None:
+        """Drop the session for ``document_id`` if it exists."""
+
+        try:
+            self.backend.delete(document_id)
+        except ValueError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self.backend.last_accesses())
+
+    def _evict(self, now: float, force: bool = False) -> None:
+        # Only one thread sweeps at a time; the others skip rather than wait.
+        if not force and now - self._swept_at < self.sweep_interval:
+            return
+        if not self._lock.acquire(blocking=force):
+            return
+        try:
+            self._swept_at = now
+            last_accesses = self.backend.last_accesses()
+            expired = [
+                document_id
+                for document_id, last_access in last_accesses.items()
+                if now - last_access > self.ttl_seconds
+            ]
+            overflow = len(last_accesses) - len(expired) - self.max_documents
+            if overflow > 0:
+                live = sorted(
+                    (item for item in last_accesses.items() if item[0] not in expired),
+                    key=lambda item: item[1],
+                )
+                expired.extend(document_id for document_id, _ in live[:overflow])
+
+            for document_id in expired:
+                self.backend.delete(document_id)
+        finally:
+            self._lock.release()
@@ -0,0 +1,148 @@
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from aimakerspace.vectordatabase import ApproximateIndex, VectorDatabase, top_k_indices
+
+
+class IVFIndex(ApproximateIndex):
+    """Approximate cosine search over a ``VectorDatabase`` using an inverted file.
+
+    The normalised rows of the database are clustered with spherical k-means
+    into ``n_lists`` cells. A query is compared against the centroids first
+    and only the rows of the ``nprobe`` closest cells are scored exactly, so
+    ``nprobe`` trades recall for latency (``nprobe == n_lists`` is exhaustive);
+    :meth:`recall` with ``nprobe=...`` helps choose it.
+    """
+
+    _ASSIGN_BATCH = 65536
+
+    def __init__(
+        self,
+        n_lists: Optional[int] = None,
+        nprobe: int = 8,
+        n_iter: int = 20,
+        sample_size: Optional[int] = None,
+        seed: int = 0,
+    ):
+        if n_lists is not None and n_lists <= 0:
+            raise ValueError("n_lists must be a positive integer")
+        if nprobe <= 0:
+            raise ValueError("nprobe must be a positive integer")
+
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.sample_size = sample_size
+        self.seed = seed
+
+        self.database: Optional[VectorDatabase] = None
+        self.centroids = np.empty((0, 0), dtype=np.float32)
+        self._keys: List[str] = []
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._buffer_rows: Optional[np.ndarray] = None
+        self._list_rows = np.empty(0, dtype=np.int64)
+        self._list_offsets = np.zeros(1, dtype=np.int64)
+
+    def build(self, database: VectorDatabase) -> "IVFIndex":
+        """Cluster the rows of ``database`` and build the inverted lists."""
+
+        matrix = database.matrix
+        if matrix.shape[0] == 0:
+            raise ValueError("Cannot build an index over an empty database")
+
+        rng = np.random.default_rng(self.seed)
+        n_lists = self.n_lists or max(1, int(round(np.sqrt(matrix.shape[0]))))
+        n_lists = min(n_lists, matrix.shape[0])
+
+        sample_size = self.sample_size or 256 * n_lists
+        if sample_size < matrix.shape[0]:
+            sample = matrix[np.sort(rng.choice(matrix.shape[0], sample_size, replace=False))]
+        else:
+            sample = matrix
+
+        centroids = self._train(sample, n_lists, rng)
+        assignments = self._assign(matrix, centroids)
+
+        self.database = database
+        self.centroids = centroids
+        self._keys = database.keys()
+        # Score against the database's own (possibly memory-mapped) buffer
+        # rather than ``matrix``, which is a full in-memory copy of the live
+        # rows while the database has tombstones.
+        self._matrix, self._buffer_rows = database.live_buffer()
+        self._list_rows = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_lists)
+        self._list_offsets = np.concatenate(([0], np.cumsum(counts)))
+        return self
+
+    def list_sizes(self) -> List[int]:
+        """Return the number of rows held by each inverted list."""
+
+        return np.diff(self._list_offsets).tolist()
+
+    def search(
+        self,
+        query_vector: Iterable[float],
+        k: int,
+        nprobe: Optional[int] = None,
+    ) -> List[Tuple[str, float]]:
+        """Return approximately the ``k`` rows most similar to ``query_vector``."""
+
+        if k <= 0:
+            raise ValueError("k must be a positive integer")
+        if self.database is None:
+            raise RuntimeError("Index has not been built; call build() first")
+
+        query = self.database.normalise_query(query_vector)
+        probes = min(nprobe or self.nprobe, self.centroids.shape[0])
+        cells = top_k_indices(self.centroids @ query, probes)
+        rows = np.concatenate(
+            [
+                self._list_rows[self._list_offsets[cell] : self._list_offsets[cell + 1]]
+                for cell in cells
+            ]
+        )
+        if rows.shape[0] == 0:
+            return []
+
+        buffer_rows = rows if self._buffer_rows is None else self._buffer_rows[rows]
+        scores = np.asarray(self._matrix[buffer_rows], dtype=np.float32) @ query
+        top = top_k_indices(scores, k)
+        return [(self._keys[rows[i]], float(scores[i])) for i in top]
+
+    def _train(
+        self, sample: np.ndarray, n_lists: int, rng: np.random.Generator
+    ) -> np.ndarray:
+        """Spherical k-means: centroids are re-normalised after every update."""
+
+        centroids = sample[rng.choice(sample.shape[0], n_lists, replace=False)].copy()
+        for _ in range(self.n_iter):
+            assignments = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=n_lists)
+
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()))]
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            updated = (sums / norms).astype(np.float32)
+            if np.allclose(updated, centroids, atol=1e-6):
+                centroids = updated
+                break
+            centroids = updated
+        return centroids
+
+    def _assign(self, matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """Return the closest centroid for every row, in bounded-size batches."""
+
+        assignments = np.empty(matrix.shape[0], dtype=np.int64)
+        for start in range(0, matrix.shape[0], self._ASSIGN_BATCH):
+            block = matrix[start : start + self._ASSIGN_BATCH]
+            assignments[start : start + block.shape[0]] = np.argmax(
+                block @ centroids.T, axis=1
+            )
+        return assignments
@@ -0,0 +1,133 @@
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens of ``text`` (Unicode-aware, punctuation dropped)."""
+
+    return _TOKEN_PATTERN.findall(text.casefold())
+
+
+class BM25Index:
+    """Okapi BM25 keyword index over a list of documents.
+
+    Every document is tokenised once, when it is added, into an inverted
+    index of ``term -> [(document, term frequency), ...]`` postings, so a
+    query only touches the postings of its own terms. Terms are scored in
+    decreasing order of their best possible contribution (MaxScore): once
+    the current k-th best score beats everything the remaining terms could
+    add, those terms only update documents that are already candidates.
+
+    Documents may be any hashable value whose ``str()`` is the text, e.g.
+    plain strings or ``text_utils.ChunkView`` objects; :meth:`search`
+    returns them as given, like ``VectorDatabase.search`` returns keys.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._documents: List[Hashable] = []
+        self._lengths: List[int] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._total_length = 0
+        self._norms: Optional[List[float]] = None
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[Hashable], **kwargs) -> "BM25Index":
+        index = cls(**kwargs)
+        index.add_many(texts)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, document: Hashable) -> int:
+        """Index ``document`` and return its position."""
+
+        position = len(self._documents)
+        terms = Counter(tokenize(str(document)))
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, []).append((position, frequency))
+        length = sum(terms.values())
+        self._documents.append(document)
+        self._lengths.append(length)
+        self._total_length += length
+        self._norms = None
+        return position
+
+    def add_many(self, documents: Iterable[Hashable]) -> None:
+        for document in documents:
+            self.add(document)
+
+    def idf(self, term: str) -> float:
+        """Inverse document frequency of ``term`` (never negative)."""
+
+        frequency = len(self._postings.get(term, ()))
+        count = len(self._documents)
+        return math.log(1.0 + (count - frequency + 0.5) / (frequency + 0.5))
+
+    def search(self, query: str, k: int) -> List[Tuple[Hashable, float]]:
+        """Return up to ``k`` ``(document, score)`` pairs, best first.
+
+        Only documents sharing at least one term with ``query`` are returned.
+        """
+
+        if k <= 0 or not self._documents:
+            return []
+
+        norms = self._document_norms()
+        k1_plus_one = self.k1 + 1.0
+        # The most a term can add is idf * (k1 + 1) (tf -> infinity).
+        weights = sorted(
+            (
+                (self.idf(term) * k1_plus_one, self.idf(term), self._postings[term])
+                for term in set(tokenize(query))
+                if term in self._postings
+            ),
+            key=lambda item: item[0],
+            reverse=True,
+        )
+        remaining = sum(bound for bound, _, _ in weights)
+
+        scores: Dict[int, float] = {}
+        accepting = True
+        for bound, idf, postings in weights:
+            remaining -= bound
+            for position, frequency in postings:
+                if not accepting and position not in scores:
+                    continue
+                contribution = idf * frequency * k1_plus_one / (frequency + norms[position])
+                scores[position] = scores.get(position, 0.0) + contribution
+            if accepting and len(scores) >= k:
+                threshold = heapq.nlargest(k, scores.values())[-1]
+                accepting = threshold <= remaining
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self._documents[position], score) for position, score in top]
+
+    def _document_norms(self) -> List[float]:
+        """``k1 * (1 - b + b * length / average_length)`` for every document."""
+
+        if self._norms is None:
+            average = self._total_length / len(self._documents) or 1.0
+            self._norms = [
+                self.k1 * (1.0 - self.b + self.b * length / average)
+                for length in self._lengths
+            ]
+        return self._norms
+
+
+if __name__ == "__main__":
+    index = BM25Index.from_texts(
+        [
+            "The cat sat on the mat.",
+            "Dogs and cats are common pets.",
+            "Vector databases store embeddings for similarity search.",
+        ]
+    )
+    print(index.search("cat on a mat", k=2))
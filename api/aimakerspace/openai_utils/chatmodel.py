@@ -1,10 +1,8 @@
 import os
-from typing import Any, AsyncIterator, Iterable, List, MutableMapping
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterable, List, MutableMapping, Optional
 
-from dotenv import load_dotenv
-from openai import AsyncOpenAI, OpenAI
-
-load_dotenv()
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
 
 ChatMessage = MutableMapping[str, Any]
 
@@ -12,14 +10,45 @@ ChatMessage = MutableMapping[str, Any]
 class ChatOpenAI:
     """Thin wrapper around the OpenAI chat completion APIs."""
 
-    def __init__(self, model_name: str = "gpt-4o-mini"):
+    def __init__(
+        self,
+        model_name: str = "gpt-4o-mini",
+        api_key: Optional[str] = None,
+        client: Optional["OpenAI"] = None,
+        async_client: Optional["AsyncOpenAI"] = None,
+    ):
         self.model_name = model_name
-        self.openai_api_key = os.getenv("OPENAI_API_KEY")
-        if self.openai_api_key is None:
+        if api_key is None:
+            # Only read .env when no key was passed in explicitly
+            from dotenv import load_dotenv
+
+            load_dotenv()
+        self.openai_api_key = api_key or os.getenv("OPENAI_API_KEY")
+        if self.openai_api_key is None and (client is None or async_client is None):
             raise ValueError("OPENAI_API_KEY is not set")
 
-        self._client = OpenAI()
-        self._async_client = AsyncOpenAI()
+        self._client = client
+        self._async_client = async_client
+
+    @property
+    def client(self) -> "OpenAI":
+        """Sync client, created on first use unless one was injected."""
+
+        if self._client is None:
+            from openai import OpenAI
+
+            self._client = OpenAI(api_key=self.openai_api_key)
+        return self._client
+
+    @property
+    def async_client(self) -> "AsyncOpenAI":
+        """Async client, created on first use unless one was injected."""
+
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+
+            self._async_client = AsyncOpenAI(api_key=self.openai_api_key)
+        return self._async_client
 
     def run(
         self,
@@ -36,7 +65,7 @@ class ChatOpenAI:
         """
 
         message_list = self._coerce_messages(messages)
-        response = self._client.chat.completions.create(
+        response = self.client.chat.completions.create(
             model=self.model_name, messages=message_list, **kwargs
         )
 
@@ -51,11 +80,13 @@ class ChatOpenAI:
         """Yield streaming completion chunks as they arrive from the API."""
 
         message_list = self._coerce_messages(messages)
-        stream = await self._async_client.chat.completions.create(
+        stream = await self.async_client.chat.completions.create(
             model=self.model_name, messages=message_list, stream=True, **kwargs
         )
 
         async for chunk in stream:
+            if not chunk.choices:
+                continue
             content = chunk.choices[0].delta.content
             if content is not None:
                 yield content
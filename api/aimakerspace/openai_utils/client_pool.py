@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Set, Tuple
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+class AsyncClientPool:
+    """Bounded LRU registry of long-lived ``AsyncOpenAI`` clients.
+
+    Clients are keyed by a SHA-256 digest of the API key (the key itself is
+    never stored as a dictionary key) and share nothing but their settings:
+    each owns an ``httpx.AsyncClient`` whose keep-alive connections are
+    reused across requests, so repeated calls skip TCP and TLS setup.
+
+    Clients idle for ``idle_timeout`` seconds, or pushed out by the
+    ``max_clients`` bound, are retired and closed after a ``close_grace``
+    period so that requests still holding them can finish. Besides the
+    optional :meth:`run_reaper` task, :meth:`get` schedules a sweep on the
+    running event loop every ``min(idle_timeout, close_grace)`` seconds, so
+    retired clients are closed even where no lifespan task runs (e.g. under
+    Mangum).
+    """
+
+    def __init__(
+        self,
+        max_clients: int = 32,
+        idle_timeout: float = 300.0,
+        close_grace: float = 60.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 60.0,
+    ):
+        if max_clients <= 0:
+            raise ValueError("max_clients must be a positive integer")
+
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.close_grace = close_grace
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.created = 0
+
+        self._clients: "OrderedDict[str, Tuple[AsyncOpenAI, float]]" = OrderedDict()
+        self._retired: List[Tuple["AsyncOpenAI", float]] = []
+        self._lock = threading.Lock()
+        self._sweep_interval = min(idle_timeout, close_grace)
+        self._next_sweep = time.monotonic() + self._sweep_interval
+        self._sweeps: Set["asyncio.Task"] = set()
+
+    def get(self, api_key: str) -> "AsyncOpenAI":
+        """Return the pooled client for ``api_key``, creating it if needed."""
+
+        digest = self.digest(api_key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._clients.pop(digest, None)
+            if entry is None:
+                client = self._create(api_key)
+                self.created += 1
+            else:
+                client = entry[0]
+            self._clients[digest] = (client, now)
+
+            while len(self._clients) > self.max_clients:
+                _, (evicted, _) = self._clients.popitem(last=False)
+                self._retired.append((evicted, now))
+
+            sweep = now >= self._next_sweep
+            if sweep:
+                self._next_sweep = now + self._sweep_interval
+        if sweep:
+            self._schedule_sweep()
+        return client
+
+    @staticmethod
+    def digest(api_key: str) -> str:
+        """Return the SHA-256 hex digest under which ``api_key``'s client is pooled."""
+
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    async def evict_idle(self) -> int:
+        """Retire idle clients and close retired ones past their grace period.
+
+        Returns the number of clients closed.
+        """
+
+        now = time.monotonic()
+        with self._lock:
+            for digest, (client, last_used) in list(self._clients.items()):
+                if now - last_used > self.idle_timeout:
+                    del self._clients[digest]
+                    self._retired.append((client, now))
+
+            closing = [
+                client
+                for client, retired_at in self._retired
+                if now - retired_at >= self.close_grace
+            ]
+            self._retired = [
+                entry for entry in self._retired if now - entry[1] < self.close_grace
+            ]
+
+        for client in closing:
+            await client.close()
+        return len(closing)
+
+    async def run_reaper(self, interval: float = 60.0) -> None:
+        """Call :meth:`evict_idle` every ``interval`` seconds until cancelled."""
+
+        while True:
+            await asyncio.sleep(interval)
+            await self.evict_idle()
+
+    async def aclose(self) -> None:
+        """Close every pooled and retired client."""
+
+        with self._lock:
+            clients = [client for client, _ in self._clients.values()]
+            clients.extend(client for client, _ in self._retired)
+            self._clients.clear()
+            self._retired = []
+
+        for client in clients:
+            await client.close()
+
+    def _schedule_sweep(self) -> None:
+        """Run :meth:`evict_idle` in the background on the running loop, if any."""
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._sweeps:
+            return
+        # Keep a reference: the loop only holds weak references to tasks.
+        task = loop.create_task(self.evict_idle())
+        self._sweeps.add(task)
+        task.add_done_callback(self._sweeps.discard)
+
+    def _create(self, api_key: str) -> "AsyncOpenAI":
+        # Imported here so that building the pool at module load stays cheap.
+        import httpx
+        from openai import AsyncOpenAI
+
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        return AsyncOpenAI(
+            api_key=api_key,
+            timeout=self.timeout,
+            http_client=httpx.AsyncClient(limits=limits, timeout=self.timeout),
+        )
@@ -1,62 +1,240 @@
 import asyncio
 import os
-from typing import Iterable, List
+import random
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional, Tuple, TypeVar
 
-from dotenv import load_dotenv
-from openai import AsyncOpenAI, OpenAI
+from aimakerspace.openai_utils.embedding_cache import EmbeddingCache
 
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+T = TypeVar("T")
+
+
+@lru_cache(maxsize=None)
+def retryable_errors() -> Tuple[type, ...]:
+    """Errors worth retrying: rate limiting (429), transient server errors and
+    dropped connections.
+
+    Resolved on first use so that importing this module does not import
+    ``openai``.
+    """
+
+    from openai import APIConnectionError, InternalServerError, RateLimitError
+
+    return (RateLimitError, InternalServerError, APIConnectionError)
 
-class EmbeddingModel:
-    """Helper for generating embeddings via the OpenAI API."""
 
-    def __init__(self, embeddings_model_name: str = "text-embedding-3-small"):
-        load_dotenv()
-        self.openai_api_key = os.getenv("OPENAI_API_KEY")
-        if self.openai_api_key is None:
+def estimate_tokens(text: str) -> int:
+    """Cheap upper-ish estimate of the token count of ``text`` (~4 chars/token)."""
+
+    return len(text) // 4 + 1
+
+
+class EmbeddingModel:
+    """Helper for generating embeddings via the OpenAI API.
+
+    Inputs are split into batches of at most ``batch_size`` texts and
+    ``max_batch_tokens`` estimated tokens. The async methods send up to
+    ``max_concurrency`` batches at once; every request is retried with
+    exponential backoff on rate limits and transient errors. Results are
+    always returned in input order.
+
+    With an :class:`EmbeddingCache`, texts already embedded with this model
+    are served from the cache and only the misses are sent to the API. The
+    async methods do cache I/O in the default executor when the cache has
+    an on-disk tier.
+    """
+
+    def __init__(
+        self,
+        embeddings_model_name: str = "text-embedding-3-small",
+        batch_size: int = 1024,
+        max_batch_tokens: int = 100_000,
+        max_concurrency: int = 4,
+        max_retries: int = 5,
+        client: Optional["OpenAI"] = None,
+        async_client: Optional["AsyncOpenAI"] = None,
+        cache: Optional[EmbeddingCache] = None,
+        api_key: Optional[str] = None,
+    ):
+        if batch_size <= 0 or max_batch_tokens <= 0 or max_concurrency <= 0:
+            raise ValueError("batch_size, max_batch_tokens and max_concurrency must be positive")
+
+        if api_key is None:
+            # Only read .env when no key was passed in explicitly
+            from dotenv import load_dotenv
+
+            load_dotenv()
+        self.openai_api_key = api_key or os.getenv("OPENAI_API_KEY")
+        if self.openai_api_key is None and (client is None or async_client is None):
             raise ValueError(
                 "OPENAI_API_KEY environment variable is not set. "
                 "Please configure it with your OpenAI API key."
             )
 
         self.embeddings_model_name = embeddings_model_name
-        self.async_client = AsyncOpenAI()
-        self.client = OpenAI()
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.cache = cache
+        self._async_client = async_client
+        self._client = client
+
+    @property
+    def async_client(self) -> "AsyncOpenAI":
+        """Async client, created on first use unless one was injected."""
+
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+
+            self._async_client = AsyncOpenAI(api_key=self.openai_api_key)
+        return self._async_client
+
+    @property
+    def client(self) -> "OpenAI":
+        """Sync client, created on first use unless one was injected."""
+
+        if self._client is None:
+            from openai import OpenAI
+
+            self._client = OpenAI(api_key=self.openai_api_key)
+        return self._client
 
     async def async_get_embeddings(self, list_of_text: Iterable[str]) -> List[List[float]]:
         """Return embeddings for ``list_of_text`` using the async client."""
 
-        embedding_response = await self.async_client.embeddings.create(
-            input=list(list_of_text), model=self.embeddings_model_name
-        )
+        texts = list(list_of_text)
+        cached, missing = await self._off_loop(self._lookup, texts)
+        if not missing:
+            return cached
+
+        batches = self._batches(missing)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
 
-        return [item.embedding for item in embedding_response.data]
+        async def embed(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self._async_create(batch)
+
+        results = await asyncio.gather(*(embed(batch) for batch in batches))
+        fetched = [embedding for batch_result in results for embedding in batch_result]
+        return await self._off_loop(self._merge, texts, cached, missing, fetched)
 
     async def async_get_embedding(self, text: str) -> List[float]:
         """Return an embedding for a single text using the async client."""
 
-        embedding = await self.async_client.embeddings.create(
-            input=text, model=self.embeddings_model_name
-        )
-
-        return embedding.data[0].embedding
+        return (await self.async_get_embeddings([text]))[0]
 
     def get_embeddings(self, list_of_text: Iterable[str]) -> List[List[float]]:
         """Return embeddings for ``list_of_text`` using the sync client."""
 
-        embedding_response = self.client.embeddings.create(
-            input=list(list_of_text), model=self.embeddings_model_name
-        )
+        texts = list(list_of_text)
+        cached, missing = self._lookup(texts)
+        if not missing:
+            return cached
 
-        return [item.embedding for item in embedding_response.data]
+        fetched: List[List[float]] = []
+        for batch in self._batches(missing):
+            fetched.extend(self._create(batch))
+        return self._merge(texts, cached, missing, fetched)
 
     def get_embedding(self, text: str) -> List[float]:
         """Return an embedding for a single text using the sync client."""
 
-        embedding = self.client.embeddings.create(
-            input=text, model=self.embeddings_model_name
-        )
-
-        return embedding.data[0].embedding
+        return self.get_embeddings([text])[0]
+
+    async def _off_loop(self, function: Callable[..., T], *args) -> T:
+        """Call ``function`` in the default executor if it may touch the disk cache."""
+
+        if self.cache is None or not self.cache.on_disk:
+            return function(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, function, *args)
+
+    def _lookup(self, texts: List[str]) -> Tuple[List[Optional[List[float]]], List[str]]:
+        """Return cached embeddings (``None`` for misses) and the texts to fetch."""
+
+        if self.cache is None:
+            return [None] * len(texts), texts
+        cached = self.cache.get_many(self.embeddings_model_name, texts)
+        missing = list(dict.fromkeys(text for text, hit in zip(texts, cached) if hit is None))
+        return cached, missing
+
+    def _merge(
+        self,
+        texts: List[str],
+        cached: List[Optional[List[float]]],
+        missing: List[str],
+        fetched: List[List[float]],
+    ) -> List[List[float]]:
+        """Cache freshly fetched embeddings and fill them into input order."""
+
+        if self.cache is None:
+            return fetched
+        self.cache.put_many(self.embeddings_model_name, missing, fetched)
+        by_text = dict(zip(missing, fetched))
+        return [hit if hit is not None else by_text[text] for text, hit in zip(texts, cached)]
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        """Split ``texts`` into consecutive request-sized batches."""
+
+        batches: List[List[str]] = []
+        current: List[str] = []
+        current_tokens = 0
+        for text in texts:
+            tokens = estimate_tokens(text)
+            if current and (
+                len(current) >= self.batch_size
+                or current_tokens + tokens > self.max_batch_tokens
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _async_create(self, batch: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                response = await self.async_client.embeddings.create(
+                    input=batch, model=self.embeddings_model_name
+                )
+                return self._ordered_embeddings(response)
+            except retryable_errors():
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+
+    def _create(self, batch: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                response = self.client.embeddings.create(
+                    input=batch, model=self.embeddings_model_name
+                )
+                return self._ordered_embeddings(response)
+            except retryable_errors():
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+
+    @staticmethod
+    def _ordered_embeddings(response) -> List[List[float]]:
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """Exponential backoff with full jitter, capped at 20 seconds."""
+
+        return random.uniform(0, min(20.0, 0.5 * 2**attempt))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,243 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+
+def content_hash(text: str) -> str:
+    """Return a stable content id for ``text`` (hex BLAKE2b-128 of its UTF-8)."""
+
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache keyed by ``(model name, content hash)``.
+
+    Vectors are held as packed ``float32`` arrays in an in-memory LRU tier of
+    at most ``max_memory_bytes``. When ``path`` is given, they are also
+    written to a SQLite file that is trimmed back below ``max_disk_bytes``
+    (least recently read first) and survives process restarts. All methods
+    are thread-safe.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        max_disk_bytes: int = 1024 * 1024 * 1024,
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        self._memory: "OrderedDict[str, array]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0
+        if path is not None:
+            self._open(Path(path))
+
+    @property
+    def on_disk(self) -> bool:
+        """Whether lookups and stores also hit the SQLite tier."""
+
+        return self._connection is not None
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """Return the cached embedding of ``text`` under ``model``, if any."""
+
+        return self.get_many(model, [text])[0]
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Look up every text; misses are returned as ``None``."""
+
+        keys = [self._key(model, text) for text in texts]
+        with self._lock:
+            found: Dict[str, array] = {}
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            if missing and self._connection is not None:
+                for key, vector in self._disk_lookup(missing).items():
+                    found[key] = vector
+                    self.disk_hits += 1
+                    self._remember(key, vector)
+
+            results: List[Optional[List[float]]] = []
+            for key in keys:
+                vector = found.get(key)
+                if vector is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(vector.tolist())
+            return results
+
+    def put(self, model: str, text: str, embedding: Iterable[float]) -> None:
+        """Store ``embedding`` as the embedding of ``text`` under ``model``."""
+
+        self.put_many(model, [text], [embedding])
+
+    def put_many(
+        self, model: str, texts: Sequence[str], embeddings: Sequence[Iterable[float]]
+    ) -> None:
+        """Store one embedding per text."""
+
+        entries = list(
+            {
+                self._key(model, text): array("f", embedding)
+                for text, embedding in zip(texts, embeddings)
+            }.items()
+        )
+        with self._lock:
+            for key, vector in entries:
+                self._remember(key, vector)
+            if self._connection is not None:
+                self._disk_store(entries)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Return hit/miss counters and the current tier sizes."""
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def clear(self) -> None:
+        """Drop every cached embedding from both tiers."""
+
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._connection is not None:
+                self._connection.execute("DELETE FROM embeddings")
+                self._connection.commit()
+                self._disk_bytes = 0
+
+    def close(self) -> None:
+        """Close the on-disk tier, if any."""
+
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    @staticmethod
+    def _key(model: str, text: str) -> str:
+        return f"{model}:{content_hash(text)}"
+
+    def _remember(self, key: str, vector: array) -> None:
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= _nbytes(previous)
+        self._memory[key] = vector
+        self._memory_bytes += _nbytes(vector)
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= _nbytes(evicted)
+            self.evictions += 1
+
+    def _open(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)"
+        )
+        self._connection.commit()
+        row = self._connection.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+        self._disk_bytes = int(row[0])
+
+    def _disk_lookup(self, keys: List[str]) -> Dict[str, array]:
+        found: Dict[str, array] = {}
+        # Stay well below SQLite's bound-parameter limit.
+        for start in range(0, len(keys), 500):
+            chunk = keys[start : start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._connection.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            for key, blob in rows:
+                vector = array("f")
+                vector.frombytes(blob)
+                found[key] = vector
+
+        if found:
+            now = time.time()
+            self._connection.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+            self._connection.commit()
+        return found
+
+    def _disk_store(self, entries: List[tuple]) -> None:
+        now = time.time()
+        keys = [key for key, _ in entries]
+        existing = 0
+        for start in range(0, len(keys), 500):
+            chunk = keys[start : start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            row = self._connection.execute(
+                "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings "
+                f"WHERE key IN ({placeholders})",
+                chunk,
+            ).fetchone()
+            existing += int(row[0])
+
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+            [(key, vector.tobytes(), now) for key, vector in entries],
+        )
+        self._disk_bytes += sum(_nbytes(vector) for _, vector in entries) - existing
+        if self._disk_bytes > self.max_disk_bytes:
+            self._trim_disk()
+        self._connection.commit()
+
+    def _trim_disk(self) -> None:
+        """Delete least recently read rows until the file is 10% under budget."""
+
+        target = int(self.max_disk_bytes * 0.9)
+        rows = self._connection.execute(
+            "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_access"
+        )
+        doomed: List[str] = []
+        for key, size in rows:
+            if self._disk_bytes <= target:
+                break
+            doomed.append(key)
+            self._disk_bytes -= size
+        self._connection.executemany(
+            "DELETE FROM embeddings WHERE key = ?", [(key,) for key in doomed]
+        )
+        self.evictions += len(doomed)
+
+
+def _nbytes(vector: array) -> int:
+    return len(vector) * vector.itemsize
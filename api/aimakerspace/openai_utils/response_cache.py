@@ -0,0 +1,201 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Union
+
+from aimakerspace.openai_utils.embedding_cache import content_hash
+
+if TYPE_CHECKING:
+    import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class _CachedAnswer:
+    scope: str
+    answer: str
+    created_at: float
+    embedding: Optional["np.ndarray"] = None
+
+
+class ResponseCache:
+    """LRU cache of chat answers with an exact and a near-duplicate tier.
+
+    Answers are grouped by a *scope* (see :meth:`scope`): the model, a hash
+    of the system prompt, the document id, a hash of the retrieved context
+    and a hash of the API key, so one key's answers are never served to
+    another. Within a scope a question is first looked up exactly (after
+    case and whitespace normalisation); failing that, when a query embedding
+    is supplied, the stored question with the highest cosine similarity is
+    reused if it reaches ``similarity_threshold``. Because the retrieved
+    context is part of the scope, a near-duplicate can only hit when it
+    retrieved the very same chunks.
+
+    At most ``max_entries`` answers are kept (least recently used first) and
+    each expires ``ttl_seconds`` after it was stored. All methods are
+    thread-safe.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600.0,
+        similarity_threshold: float = 0.95,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries: "OrderedDict[str, _CachedAnswer]" = OrderedDict()
+        self._scopes: Dict[str, Dict[str, None]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def scope(
+        model: str,
+        system_prompt: str,
+        document_id: Optional[str] = None,
+        context: str = "",
+        api_key: str = "",
+    ) -> str:
+        """Return the cache scope for answers generated under these inputs."""
+
+        return "\x00".join(
+            (
+                model,
+                content_hash(system_prompt),
+                document_id or "",
+                content_hash(context),
+                content_hash(api_key),
+            )
+        )
+
+    def get(
+        self,
+        scope: str,
+        query: str,
+        query_embedding: Optional[Iterable[float]] = None,
+    ) -> Optional[str]:
+        """Return a cached answer to ``query`` (or a near-duplicate of it) in ``scope``."""
+
+        now = time.time()
+        key = self._key(scope, query)
+        with self._lock:
+            entry = self._live_entry(key, now)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.answer
+
+            if query_embedding is not None:
+                match = self._nearest(scope, _normalise(query_embedding), now)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self.semantic_hits += 1
+                    return self._entries[match].answer
+
+            self.misses += 1
+            return None
+
+    def put(
+        self,
+        scope: str,
+        query: str,
+        answer: str,
+        query_embedding: Optional[Iterable[float]] = None,
+    ) -> None:
+        """Store ``answer`` for ``query`` in ``scope``."""
+
+        if self.max_entries <= 0:
+            return
+
+        key = self._key(scope, query)
+        embedding = None if query_embedding is None else _normalise(query_embedding)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = _CachedAnswer(scope, answer, time.time(), embedding)
+            self._scopes.setdefault(scope, {})[key] = None
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Return hit/miss counters and the current number of answers."""
+
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+            }
+
+    def clear(self) -> None:
+        """Drop every cached answer."""
+
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _key(scope: str, query: str) -> str:
+        return scope + "\x00" + content_hash(_WHITESPACE.sub(" ", query).strip().casefold())
+
+    def _live_entry(self, key: str, now: float) -> Optional[_CachedAnswer]:
+        entry = self._entries.get(key)
+        if entry is not None and now - entry.created_at > self.ttl_seconds:
+            self._drop(key)
+            return None
+        return entry
+
+    def _nearest(self, scope: str, embedding: "np.ndarray", now: float) -> Optional[str]:
+        import numpy as np
+
+        candidates = [
+            key
+            for key in list(self._scopes.get(scope, ()))
+            if self._live_entry(key, now) is not None
+            and self._entries[key].embedding is not None
+        ]
+        if not candidates:
+            return None
+
+        matrix = np.stack([self._entries[key].embedding for key in candidates])
+        scores = matrix @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return candidates[best]
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._scopes.get(entry.scope)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del self._scopes[entry.scope]
+
+
+def _normalise(vector: Iterable[float]) -> "np.ndarray":
+    # numpy is only needed once embeddings are involved; keep it off the
+    # import path of the chat endpoint.
+    import numpy as np
+
+    array = np.asarray(list(vector), dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    return array / norm if norm else array
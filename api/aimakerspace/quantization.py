@@ -0,0 +1,269 @@
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from aimakerspace.vectordatabase import ApproximateIndex, VectorDatabase, top_k_indices
+
+# Rows are decoded to float32 a block at a time; size the blocks by bytes so
+# the scratch copy stays small whatever the dimension.
+_BLOCK_BYTES = 8 * 1024 * 1024
+
+
+def _block_rows(dimension: int) -> int:
+    """Rows per block so that a float32 block takes about ``_BLOCK_BYTES``."""
+
+    return max(1, _BLOCK_BYTES // (4 * max(1, dimension)))
+
+
+class Float16Quantizer:
+    """Store normalised rows as ``float16``: 2 bytes per dimension."""
+
+    def fit(self, matrix: np.ndarray) -> "Float16Quantizer":
+        return self
+
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        return np.asarray(matrix, dtype=np.float16)
+
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        step = _block_rows(codes.shape[1])
+        for start in range(0, codes.shape[0], step):
+            block = codes[start : start + step].astype(np.float32)
+            scores[start : start + block.shape[0]] = block @ query
+        return scores
+
+    def memory_bytes(self, codes: np.ndarray) -> int:
+        return codes.nbytes
+
+
+class Int8Quantizer:
+    """Symmetric per-row ``int8`` codes: 1 byte per dimension plus one scale.
+
+    Each row is divided by ``max(|x|) / 127`` and rounded, so the score of a
+    row is ``scale * (codes @ query)``.
+    """
+
+    def fit(self, matrix: np.ndarray) -> "Int8Quantizer":
+        return self
+
+    def encode(self, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        codes = np.empty(matrix.shape, dtype=np.int8)
+        scales = np.empty(matrix.shape[0], dtype=np.float32)
+        step = _block_rows(matrix.shape[1])
+        for start in range(0, matrix.shape[0], step):
+            block = np.asarray(matrix[start : start + step], dtype=np.float32)
+            block_scales = np.abs(block).max(axis=1) / 127.0
+            block_scales[block_scales == 0] = 1.0
+            codes[start : start + block.shape[0]] = np.rint(block / block_scales[:, None])
+            scales[start : start + block.shape[0]] = block_scales
+        return codes, scales
+
+    def score(self, codes: Tuple[np.ndarray, np.ndarray], query: np.ndarray) -> np.ndarray:
+        values, scales = codes
+        scores = np.empty(values.shape[0], dtype=np.float32)
+        step = _block_rows(values.shape[1])
+        for start in range(0, values.shape[0], step):
+            block = values[start : start + step].astype(np.float32)
+            scores[start : start + block.shape[0]] = block @ query
+        return scores * scales
+
+    def memory_bytes(self, codes: Tuple[np.ndarray, np.ndarray]) -> int:
+        return codes[0].nbytes + codes[1].nbytes
+
+
+class ProductQuantizer:
+    """Product quantisation: ``n_subvectors`` bytes per row.
+
+    The dimensions are split into ``n_subvectors`` contiguous groups and
+    each group is replaced by the id of its nearest of 256 k-means
+    centroids. Scores are computed with per-query lookup tables (asymmetric
+    distance computation), so the query itself is never quantised.
+    """
+
+    def __init__(
+        self,
+        n_subvectors: int = 96,
+        n_centroids: int = 256,
+        n_iter: int = 15,
+        sample_size: int = 65536,
+        seed: int = 0,
+    ):
+        if not 0 < n_centroids <= 256:
+            raise ValueError("n_centroids must be between 1 and 256")
+
+        self.n_subvectors = n_subvectors
+        self.n_centroids = n_centroids
+        self.n_iter = n_iter
+        self.sample_size = sample_size
+        self.seed = seed
+        self.codebooks = np.empty((0, 0, 0), dtype=np.float32)
+
+    def fit(self, matrix: np.ndarray) -> "ProductQuantizer":
+        dimension = matrix.shape[1]
+        if dimension % self.n_subvectors != 0:
+            raise ValueError(
+                f"Dimension {dimension} is not divisible by n_subvectors={self.n_subvectors}"
+            )
+
+        rng = np.random.default_rng(self.seed)
+        if self.sample_size < matrix.shape[0]:
+            rows = np.sort(rng.choice(matrix.shape[0], self.sample_size, replace=False))
+            sample = np.asarray(matrix[rows], dtype=np.float32)
+        else:
+            sample = np.asarray(matrix, dtype=np.float32)
+
+        n_centroids = min(self.n_centroids, sample.shape[0])
+        sub_dimension = dimension // self.n_subvectors
+        self.codebooks = np.stack(
+            [
+                _kmeans(sample[:, j * sub_dimension : (j + 1) * sub_dimension],
+                        n_centroids, self.n_iter, rng)
+                for j in range(self.n_subvectors)
+            ]
+        )
+        return self
+
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        if self.codebooks.size == 0:
+            raise RuntimeError("ProductQuantizer must be fitted before encoding")
+
+        sub_dimension = self.codebooks.shape[2]
+        codes = np.empty((matrix.shape[0], self.n_subvectors), dtype=np.uint8)
+        step = _block_rows(matrix.shape[1])
+        for start in range(0, matrix.shape[0], step):
+            block = np.asarray(matrix[start : start + step], dtype=np.float32)
+            for j, codebook in enumerate(self.codebooks):
+                part = block[:, j * sub_dimension : (j + 1) * sub_dimension]
+                codes[start : start + block.shape[0], j] = _nearest(part, codebook)
+        return codes
+
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        sub_queries = query.reshape(self.n_subvectors, -1)
+        tables = np.einsum("mcs,ms->mc", self.codebooks, sub_queries)
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        subspaces = np.arange(self.n_subvectors)
+        # The lookup gathers one float32 per code, so size blocks by code width.
+        step = _block_rows(self.n_subvectors)
+        for start in range(0, codes.shape[0], step):
+            block = codes[start : start + step]
+            scores[start : start + block.shape[0]] = tables[subspaces, block].sum(axis=1)
+        return scores
+
+    def memory_bytes(self, codes: np.ndarray) -> int:
+        return codes.nbytes + self.codebooks.nbytes
+
+
+def _nearest(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest (Euclidean) centroid for every point."""
+
+    distances = (
+        np.einsum("ij,ij->i", centroids, centroids)[None, :] - 2.0 * points @ centroids.T
+    )
+    return np.argmin(distances, axis=1)
+
+
+def _kmeans(
+    points: np.ndarray, n_clusters: int, n_iter: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Plain Lloyd's k-means, reseeding empty clusters from random points."""
+
+    centroids = points[rng.choice(points.shape[0], n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _nearest(points, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, points)
+        counts = np.bincount(assignments, minlength=n_clusters)
+
+        empty = counts == 0
+        counts[empty] = 1
+        updated = sums / counts[:, None]
+        if empty.any():
+            updated[empty] = points[rng.choice(points.shape[0], int(empty.sum()))]
+        if np.allclose(updated, centroids, atol=1e-6):
+            return updated.astype(np.float32)
+        centroids = updated.astype(np.float32)
+    return centroids
+
+
+QUANTIZERS = {
+    "float16": Float16Quantizer,
+    "int8": Int8Quantizer,
+    "pq": ProductQuantizer,
+}
+
+
+class QuantizedIndex(ApproximateIndex):
+    """Compact, quantised copy of a ``VectorDatabase`` for cosine search.
+
+    ``mode`` is one of ``"float16"`` (2 bytes/dim), ``"int8"`` (1 byte/dim)
+    or ``"pq"`` (``n_subvectors`` bytes per row). Candidates are scored in
+    the quantised domain; with ``rerank`` set, the best ``rerank`` of them
+    are re-scored exactly against the database rows before the top ``k`` is
+    returned. Pair this with ``VectorDatabase.load(path, mmap=True)`` so the
+    exact vectors stay on disk and only re-ranked rows are paged in.
+    """
+
+    def __init__(self, mode: str = "int8", rerank: Optional[int] = None, **quantizer_options):
+        if mode not in QUANTIZERS:
+            raise ValueError(f"Unknown quantization mode {mode!r}; expected one of {sorted(QUANTIZERS)}")
+        if rerank is not None and rerank <= 0:
+            raise ValueError("rerank must be a positive integer")
+
+        self.mode = mode
+        self.rerank = rerank
+        self.quantizer = QUANTIZERS[mode](**quantizer_options)
+        self.database: Optional[VectorDatabase] = None
+        self.codes = None
+        self._keys: List[str] = []
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._rows: Optional[np.ndarray] = None
+
+    def build(self, database: VectorDatabase) -> "QuantizedIndex":
+        """Fit the quantiser on the rows of ``database`` and encode them."""
+
+        matrix = database.matrix
+        if matrix.shape[0] == 0:
+            raise ValueError("Cannot build an index over an empty database")
+
+        self.codes = self.quantizer.fit(matrix).encode(matrix)
+        self.database = database
+        self._keys = database.keys()
+        # Re-rank against the database's own (possibly memory-mapped) buffer
+        # rather than ``matrix``, which is a full in-memory copy of the live
+        # rows while the database has tombstones.
+        self._matrix, self._rows = database.live_buffer()
+        return self
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the quantised codes (and codebooks, for PQ)."""
+
+        return 0 if self.codes is None else self.quantizer.memory_bytes(self.codes)
+
+    def search(
+        self,
+        query_vector: Iterable[float],
+        k: int,
+        rerank: Optional[int] = None,
+    ) -> List[Tuple[str, float]]:
+        """Return approximately the ``k`` rows most similar to ``query_vector``.
+
+        ``rerank`` overrides the instance default; pass ``0`` to disable it.
+        """
+
+        if k <= 0:
+            raise ValueError("k must be a positive integer")
+        if self.database is None:
+            raise RuntimeError("Index has not been built; call build() first")
+
+        query = self.database.normalise_query(query_vector)
+        scores = self.quantizer.score(self.codes, query)
+        rerank = self.rerank if rerank is None else rerank
+        if not rerank:
+            top = top_k_indices(scores, k)
+            return [(self._keys[row], float(scores[row])) for row in top]
+
+        candidates = np.sort(top_k_indices(scores, max(k, rerank)))
+        rows = candidates if self._rows is None else self._rows[candidates]
+        exact = np.asarray(self._matrix[rows], dtype=np.float32) @ query
+        top = top_k_indices(exact, k)
+        return [(self._keys[candidates[i]], float(exact[i])) for i in top]
@@ -0,0 +1,130 @@
+import asyncio
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from aimakerspace.lexical import BM25Index
+
+if TYPE_CHECKING:
+    from aimakerspace.vectordatabase import VectorDatabase
+
+Ranking = List[Tuple[Hashable, float]]
+DenseSearch = Callable[[str, int], Awaitable[Ranking]]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Ranking],
+    k: int,
+    rrf_k: int = 60,
+    weights: Optional[Sequence[float]] = None,
+) -> Ranking:
+    """Fuse ranked ``(key, score)`` lists by weighted reciprocal rank.
+
+    Each key scores ``sum(weight / (rrf_k + rank))`` over the rankings it
+    appears in (ranks start at 1); only ranks matter, so lexical and dense
+    scores on different scales can be combined directly.
+    """
+
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[Hashable, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, (key, _) in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + weight / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def _discard_result(task: "asyncio.Future") -> None:
+    if not task.cancelled():
+        task.exception()
+
+
+class HybridRetriever:
+    """Combine BM25 keyword search with dense vector search.
+
+    Both candidate generators run concurrently (the lexical one in a worker
+    thread while the query is being embedded) and their top ``candidates``
+    are fused with :func:`reciprocal_rank_fusion`.
+
+    The lexical ranking normally arrives long before the embedding. If it
+    is decisive, i.e. its k-th hit scores at least ``decisive_ratio`` times
+    the next one, the pending dense search is cancelled and the lexical
+    top-k is returned without waiting for the embedding round-trip. Set
+    ``decisive_ratio=None`` to always fuse. Work the dense side must not
+    lose on cancellation (e.g. caching document embeddings) should be
+    shielded inside ``dense``.
+
+    ``dense`` is any ``async (query, n) -> [(key, score), ...]`` callable;
+    :meth:`from_database` wires it to a ``VectorDatabase``. Keys returned by
+    both sides must match (e.g. the same chunk strings or views).
+    """
+
+    def __init__(
+        self,
+        lexical: BM25Index,
+        dense: DenseSearch,
+        candidates: int = 20,
+        rrf_k: int = 60,
+        lexical_weight: float = 1.0,
+        dense_weight: float = 1.0,
+        decisive_ratio: Optional[float] = 1.5,
+        stats: Optional[Dict[str, int]] = None,
+    ):
+        self.lexical = lexical
+        self.dense = dense
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.lexical_weight = lexical_weight
+        self.dense_weight = dense_weight
+        self.decisive_ratio = decisive_ratio
+        # Pass a shared dict to aggregate counters across short-lived retrievers.
+        self.stats = stats if stats is not None else {}
+        self.stats.setdefault("searches", 0)
+        self.stats.setdefault("lexical_exits", 0)
+
+    @classmethod
+    def from_database(
+        cls, database: "VectorDatabase", lexical: Optional[BM25Index] = None, **kwargs
+    ) -> "HybridRetriever":
+        """Retrieve over ``database``, indexing its keys with BM25 unless ``lexical`` is given.
+
+        A lexical index built here snapshots the database; rebuild the
+        retriever after the database has been modified.
+        """
+
+        async def dense(query: str, n: int) -> Ranking:
+            query_vector = await database.embedding_model.async_get_embedding(query)
+            return database.search(query_vector, n)
+
+        return cls(lexical or BM25Index.from_texts(database.keys()), dense, **kwargs)
+
+    def is_decisive(self, ranking: Ranking, k: int) -> bool:
+        """Whether the lexical ``ranking`` (k + 1 deep) settles the top ``k``."""
+
+        if self.decisive_ratio is None or k <= 0 or len(ranking) <= k:
+            return False
+        return ranking[k - 1][1] >= self.decisive_ratio * ranking[k][1]
+
+    async def asearch(self, query: str, k: int) -> Ranking:
+        """Return the fused top ``k`` ``(key, score)`` pairs for ``query``."""
+
+        self.stats["searches"] += 1
+        depth = max(self.candidates, k + 1)
+        loop = asyncio.get_running_loop()
+        dense_task = asyncio.ensure_future(self.dense(query, depth))
+        try:
+            lexical = await loop.run_in_executor(None, self.lexical.search, query, depth)
+            if not dense_task.done() and self.is_decisive(lexical, k):
+                self.stats["lexical_exits"] += 1
+                return lexical[:k]
+            dense = await dense_task
+        finally:
+            if not dense_task.done():
+                dense_task.cancel()
+                # Retrieve the abandoned task's outcome so a failure after the
+                # early exit is not reported as "never retrieved".
+                dense_task.add_done_callback(_discard_result)
+
+        return reciprocal_rank_fusion(
+            [lexical, dense],
+            k,
+            rrf_k=self.rrf_k,
+            weights=[self.lexical_weight, self.dense_weight],
+        )
@@ -1,8 +1,230 @@
+import io
+import multiprocessing
+import os
+import re
+import uuid
+from collections import deque
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
-from typing import Iterable, List
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import PyPDF2
 
+# Documents shorter than this are extracted in-process; below it the cost of
+# re-parsing the PDF in every worker outweighs the parallel speed-up.
+PARALLEL_PDF_MIN_PAGES = 16
+
+_pdf_executor: Optional[ProcessPoolExecutor] = None
+
+
+def extract_pdf_text(data: bytes, executor: Optional[Executor] = None) -> str:
+    """Extract the text of an in-memory PDF, one ``\n``-separated entry per page.
+
+    Large documents are split into page ranges that are extracted in
+    parallel by ``executor`` (a shared process pool by default); each worker
+    parses the PDF from the same bytes, so nothing touches the filesystem.
+    If no process pool can be started (e.g. in restricted serverless
+    sandboxes) extraction falls back to the calling process.
+    """
+
+    page_count = len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+    if page_count < PARALLEL_PDF_MIN_PAGES:
+        return "\n".join(_extract_page_range((data, 0, page_count)))
+
+    try:
+        executor = executor or _shared_pdf_executor()
+        step = max(PARALLEL_PDF_MIN_PAGES // 2, -(-page_count // (os.cpu_count() or 1)))
+        ranges = [
+            (data, start, min(start + step, page_count))
+            for start in range(0, page_count, step)
+        ]
+        pages = [text for chunk in executor.map(_extract_page_range, ranges) for text in chunk]
+    except (OSError, NotImplementedError, RuntimeError) as error:
+        if isinstance(error, BrokenExecutor):
+            _discard_pdf_executor(executor)
+        pages = _extract_page_range((data, 0, page_count))
+    return "\n".join(pages)
+
+
+def _extract_page_range(task: Tuple[bytes, int, int]) -> List[str]:
+    data, start, end = task
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    return [reader.pages[index].extract_text() or "" for index in range(start, end)]
+
+
+def _shared_pdf_executor() -> ProcessPoolExecutor:
+    global _pdf_executor
+    if _pdf_executor is None:
+        # The server process runs threads, which fork() would copy in an
+        # arbitrary state; start workers from a clean process instead.
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        _pdf_executor = ProcessPoolExecutor(
+            max_workers=min(4, os.cpu_count() or 1), mp_context=context
+        )
+    return _pdf_executor
+
+
+def _discard_pdf_executor(executor: Optional[Executor]) -> None:
+    """Drop the shared pool if ``executor`` is it, so the next call starts a new one."""
+
+    global _pdf_executor
+    if executor is not None and executor is _pdf_executor:
+        _pdf_executor = None
+        executor.shutdown(wait=False)
+
+
+@dataclass
+class LoadedDocument:
+    """Outcome of loading one file: its text, or the error that prevented it."""
+
+    path: Path
+    text: Optional[str] = None
+    error: Optional[BaseException] = None
+
+
+def _iter_parallel(
+    paths: Iterable[Path],
+    reader: Callable[[Path], str],
+    make_executor: Callable[[], Executor],
+    max_pending: int,
+) -> Iterator[LoadedDocument]:
+    """Run ``reader`` over ``paths`` on an executor, yielding results in path order.
+
+    At most ``max_pending`` files are submitted ahead of the consumer, so
+    memory is bounded by that window rather than by the number of files.
+    If the executor breaks (e.g. a worker process is killed), the files it
+    still held are reported with that error and the remaining files go to
+    a fresh executor from ``make_executor``.
+    """
+
+    pending: Deque[Tuple[Path, Executor, Future]] = deque()
+    path_iterator = iter(paths)
+    executor = make_executor()
+
+    def replace(broken: Executor) -> None:
+        nonlocal executor
+        if executor is broken:
+            broken.shutdown(wait=False)
+            executor = make_executor()
+
+    def submit_next() -> None:
+        for path in path_iterator:
+            try:
+                future = executor.submit(reader, path)
+            except BrokenExecutor:
+                # Broken by an earlier file; this one never ran, so retry it.
+                replace(executor)
+                future = executor.submit(reader, path)
+            pending.append((path, executor, future))
+            return
+
+    try:
+        for _ in range(max_pending):
+            submit_next()
+        while pending:
+            path, owner, future = pending.popleft()
+            submit_next()
+            try:
+                text = future.result()
+            except BrokenExecutor as error:
+                replace(owner)
+                yield LoadedDocument(path, error=error)
+            except Exception as error:
+                yield LoadedDocument(path, error=error)
+            else:
+                yield LoadedDocument(path, text=text)
+    finally:
+        executor.shutdown()
+
+
+def _read_text_path(file_path: Path, encoding: str) -> str:
+    with file_path.open("r", encoding=encoding) as file_handle:
+        return file_handle.read()
+
+
+def _pdf_pages(file_path: Path) -> Iterator[str]:
+    with file_path.open("rb") as file_handle:
+        pdf_reader = PyPDF2.PdfReader(file_handle)
+        for page in pdf_reader.pages:
+            yield page.extract_text() or ""
+
+
+def _read_pdf_path(file_path: Path) -> str:
+    return "\n".join(_pdf_pages(file_path))
+
+
+class DocumentBuffer:
+    """Holds each full document once so chunks can refer to it by offset."""
+
+    def __init__(self):
+        self._documents: Dict[str, str] = {}
+
+    def add(self, text: str, doc_id: Optional[str] = None) -> str:
+        """Store ``text`` and return its document id (generated if omitted)."""
+
+        doc_id = doc_id or uuid.uuid4().hex
+        self._documents[doc_id] = text
+        return doc_id
+
+    def remove(self, doc_id: str) -> None:
+        self._documents.pop(doc_id, None)
+
+    def views(self, doc_id: str, spans: Iterable[Tuple[int, int]]) -> List["ChunkView"]:
+        """Return a :class:`ChunkView` for every ``(start, end)`` span of ``doc_id``."""
+
+        return [ChunkView(self, doc_id, start, end) for start, end in spans]
+
+    def __getitem__(self, doc_id: str) -> str:
+        return self._documents[doc_id]
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self._documents
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+
+class ChunkView:
+    """A chunk stored as ``(doc_id, start, end)`` offsets into a :class:`DocumentBuffer`.
+
+    No text is copied until :attr:`text` (or ``str(view)``) is read, so a
+    corpus split with overlap costs one copy of each document plus a few
+    integers per chunk. Views compare and hash by position, which makes
+    them usable as ``VectorDatabase`` keys.
+    """
+
+    __slots__ = ("buffer", "doc_id", "start", "end")
+
+    def __init__(self, buffer: DocumentBuffer, doc_id: str, start: int, end: int):
+        self.buffer = buffer
+        self.doc_id = doc_id
+        self.start = start
+        self.end = end
+
+    @property
+    def text(self) -> str:
+        return self.buffer[self.doc_id][self.start : self.end]
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ChunkView):
+            return NotImplemented
+        return (self.doc_id, self.start, self.end) == (other.doc_id, other.start, other.end)
+
+    def __hash__(self) -> int:
+        return hash((self.doc_id, self.start, self.end))
+
+    def __repr__(self) -> str:
+        return f"ChunkView({self.doc_id!r}, {self.start}, {self.end})"
+
 
 class TextFileLoader:
     """Load plain-text documents from a single file or an entire directory."""
@@ -33,6 +255,34 @@ class TextFileLoader:
         self.load()
         return self.documents
 
+    def load_parallel(self, max_workers: Optional[int] = None) -> List[LoadedDocument]:
+        """Load every file on a thread pool, keeping the sequential order.
+
+        ``self.documents`` receives the texts that loaded; the failures are
+        returned (and the batch is not aborted by them).
+        """
+
+        results = list(self.iter_parallel(max_workers))
+        self.documents = [result.text for result in results if result.error is None]
+        return [result for result in results if result.error is not None]
+
+    def iter_parallel(
+        self, max_workers: Optional[int] = None, max_pending: Optional[int] = None
+    ) -> Iterator[LoadedDocument]:
+        """Lazily yield a :class:`LoadedDocument` per file, in sequential order.
+
+        Files are read by up to ``max_workers`` threads with at most
+        ``max_pending`` (default ``2 * max_workers``) read ahead.
+        """
+
+        workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        yield from _iter_parallel(
+            self._iter_paths(),
+            partial(_read_text_path, encoding=self.encoding),
+            partial(ThreadPoolExecutor, max_workers=workers),
+            max_pending or 2 * workers,
+        )
+
     def _iter_documents(self) -> Iterable[str]:
         if self.path.is_dir():
             yield from self._iter_directory(self.path)
@@ -43,14 +293,25 @@ class TextFileLoader:
                 "Provided path must be a directory or a .txt file: " f"{self.path}"
             )
 
+    def _iter_paths(self) -> Iterator[Path]:
+        if self.path.is_dir():
+            for entry in sorted(self.path.rglob("*.txt")):
+                if entry.is_file():
+                    yield entry
+        elif self.path.is_file() and self.path.suffix.lower() == ".txt":
+            yield self.path
+        else:
+            raise ValueError(
+                "Provided path must be a directory or a .txt file: " f"{self.path}"
+            )
+
     def _iter_directory(self, directory: Path) -> Iterable[str]:
         for entry in sorted(directory.rglob("*.txt")):
             if entry.is_file():
                 yield self._read_text_file(entry)
 
     def _read_text_file(self, file_path: Path) -> str:
-        with file_path.open("r", encoding=self.encoding) as file_handle:
-            return file_handle.read()
+        return _read_text_path(file_path, self.encoding)
 
 
 class CharacterTextSplitter:
@@ -70,8 +331,42 @@ class CharacterTextSplitter:
     def split(self, text: str) -> List[str]:
         """Split ``text`` into chunks preserving the configured overlap."""
 
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def split_spans(self, text: str) -> List[Tuple[int, int]]:
+        """Return the ``(start, end)`` character offsets of each chunk of ``text``."""
+
         step = self.chunk_size - self.chunk_overlap
-        return [text[i : i + self.chunk_size] for i in range(0, len(text), step)]
+        return [(i, min(i + self.chunk_size, len(text))) for i in range(0, len(text), step)]
+
+    def split_views(
+        self, text: str, buffer: DocumentBuffer, doc_id: Optional[str] = None
+    ) -> List[ChunkView]:
+        """Add ``text`` to ``buffer`` and return its chunks as zero-copy views."""
+
+        doc_id = buffer.add(text, doc_id)
+        return buffer.views(doc_id, self.split_spans(text))
+
+    def split_stream(self, pieces: Iterable[str], separator: str = "\n") -> Iterator[str]:
+        """Lazily split text that arrives in pieces (e.g. one PDF page at a time).
+
+        Yields exactly the chunks ``split(separator.join(pieces))`` would,
+        but chunks spanning a piece boundary are carried over and each chunk
+        is emitted as soon as it is complete, so only about one chunk of text
+        is held at any time.
+        """
+
+        step = self.chunk_size - self.chunk_overlap
+        buffer = ""
+        for index, piece in enumerate(pieces):
+            buffer += (separator + piece) if index else piece
+            while len(buffer) >= self.chunk_size:
+                yield buffer[: self.chunk_size]
+                buffer = buffer[step:]
+
+        while buffer:
+            yield buffer[: self.chunk_size]
+            buffer = buffer[step:]
 
     def split_texts(self, texts: List[str]) -> List[str]:
         """Split multiple texts and flatten the resulting chunks."""
@@ -82,6 +377,189 @@ class CharacterTextSplitter:
         return chunks
 
 
+_WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+_PARAGRAPH_PATTERN = re.compile(r"\S(?:.*?\S)?(?=\s*\n\s*\n|\s*$)", re.DOTALL)
+# Only tried at the start of a run of terminators, so long runs such as
+# "....." are scanned once instead of once per character.
+_SENTENCE_END_PATTERN = re.compile(r"(?<![.!?])[.!?]+[\"')\]]*(?=\s)")
+_NON_SPACE_PATTERN = re.compile(r"\S")
+_SPACE_PATTERN = re.compile(r"\S+")
+
+
+def _sentence_spans(text: str, start: int, end: int) -> Iterator[Tuple[int, int]]:
+    """``(start, end)`` of each sentence of ``text[start:end]``, in linear time.
+
+    A sentence runs from a non-space character through a run of ``.!?``
+    (and any closing quotes or brackets) that is followed by whitespace, or
+    to ``end``.
+    """
+
+    position = start
+    while True:
+        first = _NON_SPACE_PATTERN.search(text, position, end)
+        if first is None:
+            return
+        terminator = _SENTENCE_END_PATTERN.search(text, first.start(), end)
+        position = end if terminator is None else terminator.end()
+        yield first.start(), position
+
+
+def approximate_token_count(text: str) -> int:
+    """Fast local estimate of the number of BPE tokens in ``text``.
+
+    Counts one token per punctuation mark and one per started four
+    characters of each word, which tracks OpenAI tokenizers closely on
+    English prose (and errs on the high side) without any dependency.
+    """
+
+    return sum((len(word) + 3) // 4 for word in _WORD_PATTERN.findall(text))
+
+
+class TokenTextSplitter:
+    """Split text into chunks of at most ``chunk_size`` tokens.
+
+    Chunks end on paragraph or sentence boundaries where possible (falling
+    back to whitespace, then characters, for oversized sentences) and
+    consecutive chunks share up to ``chunk_overlap`` tokens of whole
+    sentences. ``length_function`` counts tokens and defaults to
+    :func:`approximate_token_count`; pass an exact tokenizer (see
+    :meth:`from_tiktoken`) when limits must be hit precisely.
+
+    Each sentence is measured once and chunks are packed with a sliding
+    window, so splitting is linear in the length of the text.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 256,
+        chunk_overlap: int = 32,
+        length_function: Callable[[str], int] = approximate_token_count,
+    ):
+        if chunk_size <= chunk_overlap:
+            raise ValueError("Chunk size must be greater than chunk overlap")
+
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length_function = length_function
+
+    @classmethod
+    def from_tiktoken(
+        cls, encoding_name: str = "cl100k_base", **kwargs
+    ) -> "TokenTextSplitter":
+        """Build a splitter that counts tokens exactly with ``tiktoken``."""
+
+        import tiktoken
+
+        encoding = tiktoken.get_encoding(encoding_name)
+        return cls(length_function=lambda text: len(encoding.encode(text)), **kwargs)
+
+    def split(self, text: str) -> List[str]:
+        """Split ``text`` into token-bounded chunks."""
+
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def split_texts(self, texts: List[str]) -> List[str]:
+        """Split multiple texts and flatten the resulting chunks."""
+
+        chunks: List[str] = []
+        for text in texts:
+            chunks.extend(self.split(text))
+        return chunks
+
+    def split_views(
+        self, text: str, buffer: DocumentBuffer, doc_id: Optional[str] = None
+    ) -> List[ChunkView]:
+        """Add ``text`` to ``buffer`` and return its chunks as zero-copy views."""
+
+        doc_id = buffer.add(text, doc_id)
+        return buffer.views(doc_id, self.split_spans(text))
+
+    def split_spans(self, text: str) -> List[Tuple[int, int]]:
+        """Return the ``(start, end)`` character offsets of each chunk of ``text``."""
+
+        units = list(self._units(text))
+        spans: List[Tuple[int, int]] = []
+        start = 0
+        while start < len(units):
+            # Grow the window as far as the token budget allows, remembering
+            # the last paragraph end inside it.
+            end, tokens, paragraph_end = start, 0, None
+            while end < len(units) and (
+                end == start or tokens + units[end][2] <= self.chunk_size
+            ):
+                tokens += units[end][2]
+                end += 1
+                if units[end - 1][3]:
+                    paragraph_end = end
+            # Prefer closing the chunk on a paragraph break unless that would
+            # leave it less than half full.
+            if end < len(units) and paragraph_end and paragraph_end < end:
+                kept = sum(unit[2] for unit in units[start:paragraph_end])
+                if kept * 2 >= self.chunk_size:
+                    end = paragraph_end
+            spans.append((units[start][0], units[end - 1][1]))
+            if end == len(units):
+                break
+
+            # Step back over whole units to build the overlap, leaving room for
+            # the next unit and always moving forward so the pass stays linear.
+            budget = min(self.chunk_overlap, self.chunk_size - units[end][2])
+            next_start, overlap = end, 0
+            while next_start - 1 > start and overlap + units[next_start - 1][2] <= budget:
+                next_start -= 1
+                overlap += units[next_start][2]
+            start = next_start
+        return spans
+
+    def _units(self, text: str) -> Iterator[Tuple[int, int, int, bool]]:
+        """Yield ``(start, end, tokens, ends_paragraph)`` for each atomic piece."""
+
+        for paragraph in _PARAGRAPH_PATTERN.finditer(text):
+            pieces = list(self._sentences(text, paragraph.start(), paragraph.end()))
+            for index, (start, end, tokens) in enumerate(pieces):
+                yield start, end, tokens, index == len(pieces) - 1
+
+    def _sentences(self, text: str, start: int, end: int) -> Iterator[Tuple[int, int, int]]:
+        for sentence_start, sentence_end in _sentence_spans(text, start, end):
+            tokens = self.length_function(text[sentence_start:sentence_end])
+            if tokens <= self.chunk_size:
+                yield sentence_start, sentence_end, tokens
+            else:
+                yield from self._words(text, sentence_start, sentence_end)
+
+    def _words(self, text: str, start: int, end: int) -> Iterator[Tuple[int, int, int]]:
+        # Oversized sentence: group words into pieces that leave room for the
+        # overlap, hard-splitting any single word that is larger than that.
+        limit = self.chunk_size - self.chunk_overlap
+        piece_start, piece_end, piece_tokens = None, start, 0
+        for word in _SPACE_PATTERN.finditer(text, start, end):
+            tokens = self.length_function(word.group())
+            if tokens > limit:
+                if piece_start is not None:
+                    yield piece_start, piece_end, piece_tokens
+                    piece_start, piece_tokens = None, 0
+                yield from self._characters(text, word.start(), word.end(), tokens)
+                continue
+            if piece_start is not None and piece_tokens + tokens > limit:
+                yield piece_start, piece_end, piece_tokens
+                piece_start, piece_tokens = None, 0
+            if piece_start is None:
+                piece_start = word.start()
+            piece_end = word.end()
+            piece_tokens += tokens
+        if piece_start is not None:
+            yield piece_start, piece_end, piece_tokens
+
+    def _characters(
+        self, text: str, start: int, end: int, tokens: int
+    ) -> Iterator[Tuple[int, int, int]]:
+        limit = self.chunk_size - self.chunk_overlap
+        width = max(1, (end - start) * limit // tokens)
+        for offset in range(start, end, width):
+            stop = min(offset + width, end)
+            yield offset, stop, self.length_function(text[offset:stop])
+
+
 class PDFLoader:
     """Extract text from PDF files stored at a path."""
 
@@ -110,6 +588,35 @@ class PDFLoader:
         self.load()
         return self.documents
 
+    def load_parallel(self, max_workers: Optional[int] = None) -> List[LoadedDocument]:
+        """Parse every PDF on a process pool, keeping the sequential order.
+
+        ``self.documents`` receives the texts that parsed; the failures are
+        returned (and the batch is not aborted by them).
+        """
+
+        results = list(self.iter_parallel(max_workers))
+        self.documents = [result.text for result in results if result.error is None]
+        return [result for result in results if result.error is not None]
+
+    def iter_parallel(
+        self, max_workers: Optional[int] = None, max_pending: Optional[int] = None
+    ) -> Iterator[LoadedDocument]:
+        """Lazily yield a :class:`LoadedDocument` per PDF, in sequential order.
+
+        PDF parsing is CPU-bound, so files are parsed by up to
+        ``max_workers`` processes with at most ``max_pending`` (default
+        ``2 * max_workers``) parsed ahead of the consumer.
+        """
+
+        workers = max_workers or os.cpu_count() or 1
+        yield from _iter_parallel(
+            self._iter_paths(),
+            _read_pdf_path,
+            partial(ProcessPoolExecutor, max_workers=workers),
+            max_pending or 2 * workers,
+        )
+
     def _iter_documents(self) -> Iterable[str]:
         if self.path.is_dir():
             yield from self._iter_directory(self.path)
@@ -120,16 +627,35 @@ class PDFLoader:
                 "Provided path must be a directory or a .pdf file: " f"{self.path}"
             )
 
+    def _iter_paths(self) -> Iterator[Path]:
+        if self.path.is_dir():
+            for entry in sorted(self.path.rglob("*.pdf")):
+                if entry.is_file():
+                    yield entry
+        elif self.path.is_file() and self.path.suffix.lower() == ".pdf":
+            yield self.path
+        else:
+            raise ValueError(
+                "Provided path must be a directory or a .pdf file: " f"{self.path}"
+            )
+
     def _iter_directory(self, directory: Path) -> Iterable[str]:
         for entry in sorted(directory.rglob("*.pdf")):
             if entry.is_file():
                 yield self._read_pdf(entry)
 
+    def iter_pages(self) -> Iterator[str]:
+        """Yield the text of each page of the PDF at ``self.path`` as it is parsed."""
+
+        if not (self.path.is_file() and self.path.suffix.lower() == ".pdf"):
+            raise ValueError(f"Provided path must be a .pdf file: {self.path}")
+        yield from self._iter_pdf_pages(self.path)
+
     def _read_pdf(self, file_path: Path) -> str:
-        with file_path.open("rb") as file_handle:
-            pdf_reader = PyPDF2.PdfReader(file_handle)
-            extracted_pages = [page.extract_text() or "" for page in pdf_reader.pages]
-        return "\n".join(extracted_pages)
+        return _read_pdf_path(file_path)
+
+    def _iter_pdf_pages(self, file_path: Path) -> Iterator[str]:
+        return _pdf_pages(file_path)
 
 
 if __name__ == "__main__":
@@ -1,8 +1,44 @@
 import asyncio
+import heapq
+import json
 import math
-from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+import os
+import tempfile
+import threading
+import uuid
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+import numpy as np
 
 from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.openai_utils.embedding_cache import content_hash
+
+
+def _write_atomic(target: Path, write: Callable[[Any], Any]) -> None:
+    """Call ``write`` on a temporary binary file, then rename it to ``target``."""
+
+    descriptor, temporary = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.")
+    try:
+        with os.fdopen(descriptor, "wb") as handle:
+            write(handle)
+        os.replace(temporary, target)
+    except BaseException:
+        os.unlink(temporary)
+        raise
 
 
 def cosine_similarity(vector_a: List[float], vector_b: List[float]) -> float:
@@ -21,65 +57,939 @@ def cosine_similarity(vector_a: List[float], vector_b: List[float]) -> float:
     return dot_product / (norm_a * norm_b)
 
 
+METRICS = ("cosine", "dot", "euclidean")
+
+DistanceMeasure = Union[str, Callable[[List[float], List[float]], float]]
+
+# Field -> expected value. A list/tuple/set value matches any of its members
+# and a callable value is used as a predicate on the stored field value.
+MetadataFilter = Mapping[str, Any]
+
+
+def dedupe_texts(list_of_text: Iterable[str]) -> Tuple[List[str], List[int]]:
+    """Split ``list_of_text`` into its distinct texts and an occurrence map.
+
+    Returns the distinct texts in first-seen order and, for every input
+    position, the index of its text in that list, so results computed once
+    per distinct text can be mapped back onto every original occurrence.
+
+    Entries are compared by the :func:`content_hash` of their text, so chunk
+    views at different offsets with the same content count as one (the
+    first of them is kept) without holding a copy of every chunk's text.
+    """
+
+    positions: Dict[str, int] = {}
+    unique: List[str] = []
+    occurrences: List[int] = []
+    for text in list_of_text:
+        position = positions.setdefault(content_hash(str(text)), len(positions))
+        if position == len(unique):
+            unique.append(text)
+        occurrences.append(position)
+    return unique, occurrences
+
+
+def _merge_metadata(entries: List[Mapping[str, Any]]) -> Dict[str, Any]:
+    """Merge the metadata of duplicate chunks; differing values become lists.
+
+    List values (e.g. from an earlier merge) are merged element-wise, so
+    merging repeatedly keeps one flat list of every occurrence's value.
+    """
+
+    merged: Dict[str, List[Any]] = {}
+    listed: Set[str] = set()
+    for entry in entries:
+        for field, value in entry.items():
+            values = merged.setdefault(field, [])
+            if isinstance(value, list):
+                listed.add(field)
+            for item in value if isinstance(value, list) else [value]:
+                if item not in values:
+                    values.append(item)
+    return {
+        field: values[0] if len(values) == 1 and field not in listed else values
+        for field, values in merged.items()
+    }
+
+
+def _indexable_values(value: Any) -> Iterator[Hashable]:
+    """Yield the values under which a metadata entry is indexed.
+
+    List-valued fields (e.g. every page a duplicated chunk appears on) are
+    indexed under each of their hashable elements.
+    """
+
+    if isinstance(value, list):
+        for item in value:
+            if item is not None and isinstance(item, Hashable):
+                yield item
+    elif value is not None and isinstance(value, Hashable):
+        yield value
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the indices of the ``k`` highest ``scores`` in descending order."""
+
+    if k >= scores.shape[0]:
+        return np.argsort(-scores, kind="stable")
+
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def _top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row-wise variant of ``top_k_indices`` for a ``(queries, N)`` matrix."""
+
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def recall_at_k(
+    database: "VectorDatabase",
+    approximate_search: Callable[[List[float], int], List[Tuple[str, float]]],
+    query_vectors: Iterable[Iterable[float]],
+    k: int,
+) -> float:
+    """Return the mean recall@k of ``approximate_search`` against exact search of ``database``."""
+
+    queries = [list(query) for query in query_vectors]
+    if not queries:
+        raise ValueError("At least one query vector is required")
+
+    hits = 0
+    total = 0
+    for query, expected in zip(queries, database.search_many(queries, k)):
+        expected_keys = {key for key, _ in expected}
+        hits += len(expected_keys.intersection(key for key, _ in approximate_search(query, k)))
+        total += len(expected_keys)
+    return hits / total if total else 1.0
+
+
+class ApproximateIndex:
+    """Base class for approximate indexes built over a ``VectorDatabase``.
+
+    Subclasses implement :meth:`build`, which must set ``self.database``,
+    and :meth:`search`; keyword options of ``search`` (e.g. ``nprobe`` or
+    ``rerank``) are forwarded by :meth:`search_many` and :meth:`recall`.
+    An index is a snapshot of the database at build time, so rebuild it
+    after the database has been modified.
+    """
+
+    database: Optional["VectorDatabase"] = None
+
+    @classmethod
+    def from_database(cls, database: "VectorDatabase", **kwargs) -> "ApproximateIndex":
+        """Build an index over ``database``, e.g. the result of ``abuild_from_list``."""
+
+        return cls(**kwargs).build(database)
+
+    def build(self, database: "VectorDatabase") -> "ApproximateIndex":
+        raise NotImplementedError
+
+    def search(self, query_vector: Iterable[float], k: int, **options) -> List[Tuple[str, float]]:
+        raise NotImplementedError
+
+    def search_many(
+        self, query_vectors: Iterable[Iterable[float]], k: int, **options
+    ) -> List[List[Tuple[str, float]]]:
+        """Run :meth:`search` for each of ``query_vectors``."""
+
+        return [self.search(query, k, **options) for query in query_vectors]
+
+    def recall(self, query_vectors: Iterable[Iterable[float]], k: int, **options) -> float:
+        """Return the mean recall@k of this index against exact search.
+
+        Useful for tuning: evaluate a handful of representative queries at
+        several settings and keep the cheapest acceptable one.
+        """
+
+        if self.database is None:
+            raise RuntimeError("Index has not been built; call build() first")
+        return recall_at_k(
+            self.database,
+            lambda query, n: self.search(query, n, **options),
+            query_vectors,
+            k,
+        )
+
+
+class _VectorView(Mapping):
+    """Read-only ``key -> list`` view over the rows of a ``VectorDatabase``."""
+
+    def __init__(self, database: "VectorDatabase"):
+        self._database = database
+
+    def __getitem__(self, key: str) -> List[float]:
+        vector = self._database.retrieve_from_key(key)
+        if vector is None:
+            raise KeyError(key)
+        return vector
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._database.keys())
+
+    def __len__(self) -> int:
+        return len(self._database)
+
+
 class VectorDatabase:
-    """Minimal in-memory vector store backed by Python lists."""
+    """In-memory vector store backed by a contiguous float32 matrix.
+
+    Every inserted vector is L2-normalised and written to a row of a
+    preallocated ``float32`` buffer (its original norm is kept alongside), so
+    a cosine search is a single matrix-vector product followed by an
+    ``argpartition`` top-k selection.
+
+    Optional per-entry metadata is stored column-wise (one list per field)
+    with an inverted ``value -> rows`` index for hashable values, so a
+    ``metadata_filter`` narrows the candidate rows before anything is scored.
+    A list-valued field matches a filter on any of its elements.
+
+    :meth:`delete` only marks a row as a tombstone; the buffers are rewritten
+    by :meth:`compact`, which runs automatically once more than half of the
+    rows are dead, so both writes and deletes stay amortised O(d).
+    """
+
+    _INITIAL_CAPACITY = 64
+    _COMPACT_RATIO = 0.5
+    _FORMAT_VERSION = 1
+    _MATRIX_FILE = "vectors.npy"
+    _NORMS_FILE = "norms.npy"
+    _INDEX_FILE = "index.json"
 
     def __init__(self, embedding_model: Optional[EmbeddingModel] = None):
-        self.vectors: Dict[str, List[float]] = {}
-        self.embedding_model = embedding_model or EmbeddingModel()
+        self._embedding_model = embedding_model
+        self._keys: List[str] = []
+        self._key_to_row: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._norms: Optional[np.ndarray] = None
+        self._deleted: Optional[np.ndarray] = None
+        self._deleted_count = 0
+        self._columns: Dict[str, List[Any]] = {}
+        self._metadata_index: Dict[str, Dict[Hashable, Set[int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._key_to_row)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._key_to_row
+
+    @property
+    def embedding_model(self) -> EmbeddingModel:
+        """The model used for text queries, created on first use if not given."""
+
+        if self._embedding_model is None:
+            self._embedding_model = EmbeddingModel()
+        return self._embedding_model
+
+    @embedding_model.setter
+    def embedding_model(self, embedding_model: EmbeddingModel) -> None:
+        self._embedding_model = embedding_model
+
+    @property
+    def dimension(self) -> Optional[int]:
+        """Dimensionality of the stored vectors, or ``None`` while empty."""
+
+        return None if self._matrix is None else self._matrix.shape[1]
+
+    @property
+    def vectors(self) -> Mapping[str, List[float]]:
+        """Read-only mapping of key to stored vector, kept for compatibility."""
+
+        return _VectorView(self)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """The L2-normalised ``(len(self), dimension)`` float32 matrix.
+
+        Rows line up with :meth:`keys`. This is a view while the store has no
+        tombstones and a copy of the live rows otherwise.
+        """
+
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=np.float32)
+        live_rows = self._live_rows()
+        if live_rows is None:
+            return self._matrix[: len(self._keys)]
+        return self._matrix[live_rows]
+
+    def live_buffer(self) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Return the backing row buffer and the ids of its live rows.
+
+        The buffer holds the normalised rows (memory-mapped for stores
+        loaded with ``mmap=True``) and may have spare or tombstoned rows;
+        row ``i`` of :attr:`matrix` is ``buffer[ids[i]]``, or ``buffer[i]``
+        when ``ids`` is ``None`` (every row is live). Unlike :attr:`matrix`
+        this never copies.
+        """
+
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=np.float32), None
+        return self._matrix, self._live_rows()
+
+    def keys(self) -> List[str]:
+        """Return the stored keys in row order."""
+
+        live_rows = self._live_rows()
+        if live_rows is None:
+            return list(self._keys)
+        return [self._keys[row] for row in live_rows]
+
+    def insert(
+        self,
+        key: str,
+        vector: Iterable[float],
+        metadata: Optional[Mapping[str, Any]] = None,
+    ) -> None:
+        """Store ``vector`` so that it can be retrieved with ``key`` later on.
+
+        ``metadata`` replaces any metadata previously stored for ``key``; when
+        omitted, the existing metadata of an overwritten key is kept.
+        """
+
+        self.upsert(key, vector, metadata)
+
+    def upsert(
+        self,
+        key: str,
+        vector: Iterable[float],
+        metadata: Optional[Mapping[str, Any]] = None,
+    ) -> bool:
+        """Insert or overwrite ``key`` in place; return ``True`` if it was new.
+
+        Overwrites reuse the existing row and new keys are appended to the
+        geometrically grown buffers, so no write copies the whole store.
+        """
+
+        row_vector = np.asarray(list(vector), dtype=np.float32)
+        if row_vector.ndim != 1:
+            raise ValueError("vector must be one-dimensional")
+
+        row = self._key_to_row.get(key)
+        is_new = row is None
+        if is_new:
+            row = len(self._keys)
+            self._reserve(row + 1, row_vector.shape[0])
+            self._keys.append(key)
+            self._key_to_row[key] = row
+            for column in self._columns.values():
+                column.append(None)
+        elif row_vector.shape[0] != self.dimension:
+            raise ValueError(
+                f"Expected a vector of dimension {self.dimension}, "
+                f"got {row_vector.shape[0]}"
+            )
+
+        self._ensure_writable()
+        norm = float(np.linalg.norm(row_vector))
+        self._norms[row] = norm
+        self._matrix[row] = row_vector / norm if norm > 0 else row_vector
+        if metadata is not None:
+            self._set_metadata(row, metadata)
+        return is_new
+
+    def delete(self, key: str) -> bool:
+        """Remove ``key`` from the store; return ``False`` if it was absent."""
+
+        row = self._key_to_row.pop(key, None)
+        if row is None:
+            return False
+
+        self._set_metadata(row, {})
+        self._deleted[row] = True
+        self._deleted_count += 1
+        if self._deleted_count > self._COMPACT_RATIO * len(self._keys):
+            self.compact()
+        return True
+
+    def compact(self) -> int:
+        """Drop tombstoned rows from the buffers; return how many were removed."""
+
+        removed = self._deleted_count
+        live_rows = self._live_rows()
+        if live_rows is None:
+            return 0
 
-    def insert(self, key: str, vector: Iterable[float]) -> None:
-        """Store ``vector`` so that it can be retrieved with ``key`` later on."""
+        size = live_rows.shape[0]
+        capacity = max(self._INITIAL_CAPACITY, 2 * size)
+        matrix = np.zeros((capacity, self._matrix.shape[1]), dtype=np.float32)
+        matrix[:size] = self._matrix[live_rows]
+        norms = np.zeros(capacity, dtype=np.float32)
+        norms[:size] = self._norms[live_rows]
+        columns = {
+            field: [column[row] for row in live_rows]
+            for field, column in self._columns.items()
+        }
 
-        self.vectors[key] = list(vector)
+        self._matrix, self._norms = matrix, norms
+        self._deleted = np.zeros(capacity, dtype=bool)
+        self._deleted_count = 0
+        self._keys = [self._keys[row] for row in live_rows]
+        self._key_to_row = {key: row for row, key in enumerate(self._keys)}
+        self._rebuild_metadata(columns)
+        return removed
+
+    def get_metadata(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the metadata stored for ``key``, or ``None`` if it is absent."""
+
+        row = self._key_to_row.get(key)
+        if row is None:
+            return None
+        return {
+            field: column[row]
+            for field, column in self._columns.items()
+            if column[row] is not None
+        }
 
     def search(
         self,
         query_vector: Iterable[float],
         k: int,
-        distance_measure: Callable[[List[float], List[float]], float] = cosine_similarity,
+        distance_measure: DistanceMeasure = cosine_similarity,
+        metadata_filter: Optional[MetadataFilter] = None,
     ) -> List[Tuple[str, float]]:
-        """Return the ``k`` vectors most similar to ``query_vector``."""
+        """Return the ``k`` vectors most similar to ``query_vector``.
+
+        ``distance_measure`` is either one of :data:`METRICS` (``"cosine"``,
+        ``"dot"`` or ``"euclidean"``, the latter scored as the negated
+        distance so that higher is always better) or an arbitrary callable,
+        which is evaluated once per stored vector. Only rows whose metadata
+        matches ``metadata_filter`` are scored.
+        """
+
+        if k <= 0:
+            raise ValueError("k must be a positive integer")
+
+        rows = self._candidate_rows(metadata_filter)
+        candidates = len(self) if rows is None else rows.shape[0]
+        if candidates == 0:
+            return []
+
+        metric = self._resolve_metric(distance_measure)
+        if metric is None:
+            query = list(query_vector)
+            keys = self.keys() if rows is None else [self._keys[row] for row in rows]
+            return heapq.nlargest(
+                k,
+                ((key, distance_measure(query, self.retrieve_from_key(key))) for key in keys),
+                key=lambda item: item[1],
+            )
+
+        scores = self._score(self._as_query(query_vector)[None, :], metric, rows)[0]
+        top = top_k_indices(scores, min(k, candidates))
+        if rows is not None:
+            return [(self._keys[rows[i]], float(scores[i])) for i in top]
+        return [(self._keys[row], float(scores[row])) for row in top]
+
+    def search_many(
+        self,
+        query_vectors: Iterable[Iterable[float]],
+        k: int,
+        distance_measure: DistanceMeasure = cosine_similarity,
+        metadata_filter: Optional[MetadataFilter] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """Return the top ``k`` matches for each of ``query_vectors``.
+
+        With a built-in metric all queries are scored together as a single
+        ``(Q, d) @ (d, N)`` product; callables fall back to calling
+        :meth:`search` once per query. ``metadata_filter`` applies to every
+        query.
+        """
 
         if k <= 0:
             raise ValueError("k must be a positive integer")
 
-        query = list(query_vector)
-        scores = [
-            (key, distance_measure(query, vector))
-            for key, vector in self.vectors.items()
+        queries = [list(query) for query in query_vectors]
+        rows = self._candidate_rows(metadata_filter)
+        candidates = len(self) if rows is None else rows.shape[0]
+        if not queries or candidates == 0:
+            return [[] for _ in queries]
+
+        metric = self._resolve_metric(distance_measure)
+        if metric is None:
+            return [
+                self.search(query, k, distance_measure, metadata_filter) for query in queries
+            ]
+
+        query_matrix = np.stack([self._as_query(query) for query in queries])
+        scores = self._score(query_matrix, metric, rows)
+        top = _top_k_rows(scores, min(k, candidates))
+        top_rows = top if rows is None else rows[top]
+        return [
+            [
+                (self._keys[row], float(row_scores[index]))
+                for row, index in zip(row_top, index_top)
+            ]
+            for row_scores, row_top, index_top in zip(scores, top_rows, top)
         ]
-        scores.sort(key=lambda item: item[1], reverse=True)
-        return scores[:k]
 
     def search_by_text(
         self,
         query_text: str,
         k: int,
-        distance_measure: Callable[[List[float], List[float]], float] = cosine_similarity,
+        distance_measure: DistanceMeasure = cosine_similarity,
         return_as_text: bool = False,
+        metadata_filter: Optional[MetadataFilter] = None,
     ) -> Union[List[Tuple[str, float]], List[str]]:
         """Vector search using an embedding generated from ``query_text``."""
 
         query_vector = self.embedding_model.get_embedding(query_text)
-        results = self.search(query_vector, k, distance_measure)
+        results = self.search(query_vector, k, distance_measure, metadata_filter)
         if return_as_text:
             return [result[0] for result in results]
         return results
 
+    def search_by_texts(
+        self,
+        query_texts: List[str],
+        k: int,
+        distance_measure: DistanceMeasure = cosine_similarity,
+        return_as_text: bool = False,
+        metadata_filter: Optional[MetadataFilter] = None,
+    ) -> Union[List[List[Tuple[str, float]]], List[List[str]]]:
+        """Batched :meth:`search_by_text` using a single embedding request."""
+
+        query_vectors = self.embedding_model.get_embeddings(query_texts)
+        return self._format_many(
+            self.search_many(query_vectors, k, distance_measure, metadata_filter),
+            return_as_text,
+        )
+
+    async def asearch_by_texts(
+        self,
+        query_texts: List[str],
+        k: int,
+        distance_measure: DistanceMeasure = cosine_similarity,
+        return_as_text: bool = False,
+        metadata_filter: Optional[MetadataFilter] = None,
+    ) -> Union[List[List[Tuple[str, float]]], List[List[str]]]:
+        """Async variant of :meth:`search_by_texts`."""
+
+        query_vectors = await self.embedding_model.async_get_embeddings(query_texts)
+        return self._format_many(
+            self.search_many(query_vectors, k, distance_measure, metadata_filter),
+            return_as_text,
+        )
+
     def retrieve_from_key(self, key: str) -> Optional[List[float]]:
         """Return the stored vector for ``key`` if present."""
 
-        return self.vectors.get(key)
+        row = self._key_to_row.get(key)
+        if row is None:
+            return None
+        return (self._matrix[row] * self._norms[row]).tolist()
+
+    async def abuild_from_list(
+        self,
+        list_of_text: List[str],
+        metadata: Optional[List[Mapping[str, Any]]] = None,
+    ) -> "VectorDatabase":
+        """Populate the vector store asynchronously from raw text snippets.
+
+        Repeated snippets, and snippets already stored, are embedded and
+        stored only once. ``metadata``, when given, holds one mapping per
+        entry of ``list_of_text``; the metadata of duplicates, including
+        snippets stored by earlier calls, is merged so that fields whose
+        values differ (e.g. ``page``) become lists of every occurrence's
+        value.
 
-    async def abuild_from_list(self, list_of_text: List[str]) -> "VectorDatabase":
-        """Populate the vector store asynchronously from raw text snippets."""
+        Entries may also be ``text_utils.ChunkView`` objects: they are used
+        as keys as-is, so the store keeps offsets instead of chunk copies.
+        """
 
-        embeddings = await self.embedding_model.async_get_embeddings(list_of_text)
-        for text, embedding in zip(list_of_text, embeddings):
+        if metadata is not None and len(metadata) != len(list_of_text):
+            raise ValueError("metadata must contain one entry per text")
+
+        unique_texts, occurrences = dedupe_texts(list_of_text)
+        merged_metadata: List[Optional[Dict[str, Any]]] = [None] * len(unique_texts)
+        if metadata is not None:
+            grouped: List[List[Mapping[str, Any]]] = [[] for _ in unique_texts]
+            for entry, unique_index in zip(metadata, occurrences):
+                grouped[unique_index].append(entry)
+            merged_metadata = [_merge_metadata(entries) for entries in grouped]
+
+        stored = [text in self for text in unique_texts]
+        to_embed = [text for text, present in zip(unique_texts, stored) if not present]
+        embeddings = []
+        if to_embed:
+            # Chunk views are only materialised for the embedding request.
+            embeddings = await self.embedding_model.async_get_embeddings(
+                [str(text) for text in to_embed]
+            )
+        for text, embedding in zip(to_embed, embeddings):
             self.insert(text, embedding)
+
+        for text, entry, present in zip(unique_texts, merged_metadata, stored):
+            if entry is None:
+                continue
+            if present:
+                # Already stored by an earlier call: keep its occurrences too.
+                entry = _merge_metadata([self.get_metadata(text) or {}, entry])
+            self._set_metadata(self._key_to_row[text], entry)
         return self
 
+    async def abuild_from_stream(
+        self,
+        chunks: Iterable[str],
+        batch_size: int = 64,
+        max_pending_batches: int = 2,
+    ) -> "VectorDatabase":
+        """Populate the store from a (possibly lazy) iterable of text chunks.
+
+        ``chunks`` is consumed in a worker thread, so a generator such as
+        ``splitter.split_stream(loader.iter_pages())`` keeps parsing while
+        earlier batches are being embedded. Each batch of ``batch_size``
+        chunks is inserted, and therefore searchable, as soon as its
+        embeddings arrive. At most ``max_pending_batches`` parsed batches wait
+        for embedding, which bounds memory regardless of document size.
+        """
+
+        if batch_size <= 0 or max_pending_batches <= 0:
+            raise ValueError("batch_size and max_pending_batches must be positive")
+
+        loop = asyncio.get_running_loop()
+        queue: "asyncio.Queue[object]" = asyncio.Queue(maxsize=max_pending_batches)
+        done = object()
+        cancelled = threading.Event()
+
+        def produce() -> None:
+            def put(item: object) -> None:
+                asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+            try:
+                batch: List[str] = []
+                for chunk in chunks:
+                    if cancelled.is_set():
+                        return
+                    batch.append(chunk)
+                    if len(batch) >= batch_size:
+                        put(batch)
+                        batch = []
+                if batch:
+                    put(batch)
+            except BaseException as error:  # re-raised by the consumer below
+                put(error)
+            else:
+                put(done)
+
+        producer = loop.run_in_executor(None, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                await self.abuild_from_list(item)
+        except BaseException:
+            # Unblock and stop the producer before propagating the error.
+            cancelled.set()
+            while not producer.done():
+                while not queue.empty():
+                    queue.get_nowait()
+                await asyncio.sleep(0.01)
+            raise
+        await producer
+        return self
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write the store to the directory ``path``.
+
+        The normalised rows go to ``vectors-<generation>.npy`` as a raw
+        ``float32`` array (row ``i`` starts at byte offset
+        ``i * dimension * 4`` of the data section), their norms to
+        ``norms-<generation>.npy`` and the keys, in row order, to
+        ``index.json`` together with the metadata columns. Chunk-view keys
+        are written out as their text.
+
+        Saving is atomic as a whole: the arrays are written under fresh,
+        generation-named files and ``index.json``, which names them, is
+        renamed into place last. A failed or interrupted save leaves the
+        previous store loadable, and stores already loaded from ``path``
+        with ``mmap=True`` keep their mapped arrays.
+        """
+
+        directory = Path(path)
+        live_rows = self._live_rows()
+        if self._norms is None:
+            norms = np.empty(0, dtype=np.float32)
+        elif live_rows is None:
+            norms = self._norms[: len(self._keys)]
+        else:
+            norms = self._norms[live_rows]
+        columns = {
+            field: column if live_rows is None else [column[row] for row in live_rows]
+            for field, column in self._columns.items()
+        }
+
+        generation = uuid.uuid4().hex
+        files = {
+            "vectors": f"vectors-{generation}.npy",
+            "norms": f"norms-{generation}.npy",
+        }
+        # Serialise first so an unencodable metadata value fails before any
+        # file has been touched.
+        index = json.dumps(
+            {
+                "version": self._FORMAT_VERSION,
+                "count": len(self),
+                "dimension": self.dimension,
+                "files": files,
+                "keys": [str(key) for key in self.keys()],
+                "metadata": columns,
+            }
+        ).encode("utf-8")
+
+        directory.mkdir(parents=True, exist_ok=True)
+        matrix = np.ascontiguousarray(self.matrix)
+        _write_atomic(directory / files["vectors"], lambda handle: np.save(handle, matrix))
+        _write_atomic(
+            directory / files["norms"],
+            lambda handle: np.save(handle, np.ascontiguousarray(norms)),
+        )
+        _write_atomic(directory / self._INDEX_FILE, lambda handle: handle.write(index))
+
+        # Older generations are unreachable now; open maps keep their inodes.
+        for stale in (
+            *directory.glob("vectors-*.npy"),
+            *directory.glob("norms-*.npy"),
+            directory / self._MATRIX_FILE,
+            directory / self._NORMS_FILE,
+        ):
+            if stale.name not in files.values():
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass
+
+    @classmethod
+    def load(
+        cls,
+        path: Union[str, Path],
+        mmap: bool = True,
+        embedding_model: Optional[EmbeddingModel] = None,
+    ) -> "VectorDatabase":
+        """Load a store written by :meth:`save`.
+
+        With ``mmap=True`` the vectors are memory-mapped read-only, so opening
+        a large store is nearly free and forked workers share the page cache
+        instead of holding private copies. The first write to such a store
+        copies the matrix into memory.
+        """
+
+        directory = Path(path)
+        with (directory / cls._INDEX_FILE).open("r", encoding="utf-8") as file_handle:
+            index = json.load(file_handle)
+        if index.get("version") != cls._FORMAT_VERSION:
+            raise ValueError(f"Unsupported vector store format: {index.get('version')}")
+
+        # Stores saved before generation-named files use the fixed names.
+        files = index.get("files", {})
+        mmap_mode = "r" if mmap else None
+        matrix = np.load(directory / files.get("vectors", cls._MATRIX_FILE), mmap_mode=mmap_mode)
+        norms = np.load(directory / files.get("norms", cls._NORMS_FILE), mmap_mode=mmap_mode)
+        keys = index["keys"]
+        if matrix.shape[0] != len(keys) or norms.shape[0] != len(keys):
+            raise ValueError(f"Vector store at {directory} is inconsistent")
+
+        database = cls(embedding_model)
+        database._keys = list(keys)
+        database._key_to_row = {key: row for row, key in enumerate(keys)}
+        database._rebuild_metadata(index.get("metadata", {}))
+        if keys:
+            database._matrix = matrix
+            database._norms = norms
+            database._deleted = np.zeros(len(keys), dtype=bool)
+        return database
+
+    @staticmethod
+    def _format_many(
+        results: List[List[Tuple[str, float]]], return_as_text: bool
+    ) -> Union[List[List[Tuple[str, float]]], List[List[str]]]:
+        if return_as_text:
+            return [[key for key, _ in result] for result in results]
+        return results
+
+    def _set_metadata(self, row: int, metadata: Mapping[str, Any]) -> None:
+        """Replace the metadata of ``row`` in the columns and inverted index."""
+
+        for field, column in self._columns.items():
+            self._unindex(field, row, column[row])
+            column[row] = None
+
+        for field, value in metadata.items():
+            column = self._columns.get(field)
+            if column is None:
+                column = self._columns[field] = [None] * len(self._keys)
+                self._metadata_index[field] = {}
+            column[row] = value
+            for indexed in _indexable_values(value):
+                self._metadata_index[field].setdefault(indexed, set()).add(row)
+
+    def _rebuild_metadata(self, columns: Mapping[str, List[Any]]) -> None:
+        """Install ``columns`` (aligned with the rows) and rebuild their index."""
+
+        self._columns = {field: list(column) for field, column in columns.items()}
+        self._metadata_index = {}
+        for field, column in self._columns.items():
+            postings = self._metadata_index[field] = {}
+            for row, value in enumerate(column):
+                for indexed in _indexable_values(value):
+                    postings.setdefault(indexed, set()).add(row)
+
+    def _live_rows(self) -> Optional[np.ndarray]:
+        """Rows that are not tombstoned, or ``None`` when every row is live."""
+
+        if not self._deleted_count:
+            return None
+        return np.flatnonzero(~self._deleted[: len(self._keys)])
+
+    def _unindex(self, field: str, row: int, value: Any) -> None:
+        postings = self._metadata_index[field]
+        for indexed in _indexable_values(value):
+            rows = postings.get(indexed)
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del postings[indexed]
+
+    def _candidate_rows(self, metadata_filter: Optional[MetadataFilter]) -> Optional[np.ndarray]:
+        """Return the sorted rows matching ``metadata_filter`` (``None``: all rows).
+
+        Equality and membership conditions on hashable values are answered
+        from the inverted index; callables and unhashable values fall back to
+        scanning that field's column.
+        """
+
+        if not metadata_filter:
+            return None
+
+        selected: Optional[Set[int]] = None
+        for field, expected in metadata_filter.items():
+            column = self._columns.get(field)
+            if column is None:
+                return np.empty(0, dtype=np.int64)
+
+            if callable(expected):
+                matches = {
+                    row
+                    for row, value in enumerate(column)
+                    if value is not None and expected(value)
+                }
+            elif isinstance(expected, (list, tuple, set, frozenset)):
+                matches = set()
+                for value in expected:
+                    matches |= self._matching_rows(field, value)
+            else:
+                matches = self._matching_rows(field, expected)
+
+            selected = matches if selected is None else selected & matches
+            if not selected:
+                return np.empty(0, dtype=np.int64)
+
+        return np.fromiter(sorted(selected), dtype=np.int64, count=len(selected))
+
+    def _matching_rows(self, field: str, expected: Any) -> Set[int]:
+        if isinstance(expected, Hashable):
+            return set(self._metadata_index[field].get(expected, ()))
+        return {row for row, value in enumerate(self._columns[field]) if value == expected}
+
+    @staticmethod
+    def _resolve_metric(distance_measure: DistanceMeasure) -> Optional[str]:
+        """Map ``distance_measure`` to a vectorised metric name, if it has one."""
+
+        if distance_measure is cosine_similarity:
+            return "cosine"
+        if isinstance(distance_measure, str):
+            if distance_measure not in METRICS:
+                raise ValueError(
+                    f"Unknown metric {distance_measure!r}; expected one of {METRICS}"
+                )
+            return distance_measure
+        return None
+
+    def _score(
+        self, queries: np.ndarray, metric: str, rows: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Score a ``(Q, d)`` block of raw queries against ``rows`` (default: all)."""
+
+        if rows is None:
+            size = len(self._keys)
+            matrix, norms = self._matrix[:size], self._norms[:size]
+        else:
+            matrix, norms = self._matrix[rows], self._norms[rows]
+
+        query_norms = np.linalg.norm(queries, axis=1)
+        if metric == "cosine":
+            safe_norms = np.where(query_norms > 0, query_norms, 1.0)
+            scores = (queries / safe_norms[:, None]) @ matrix.T
+        else:
+            products = queries @ matrix.T
+            if metric == "dot":
+                scores = products * norms
+            else:
+                squared = norms**2 + query_norms[:, None] ** 2 - 2.0 * products * norms
+                scores = -np.sqrt(np.maximum(squared, 0.0))
+
+        if rows is None and self._deleted_count:
+            # Tombstoned rows sink below every live score.
+            scores[:, self._deleted[:size]] = -np.inf
+        return scores
+
+    def _as_query(self, query_vector: Iterable[float]) -> np.ndarray:
+        query = np.asarray(list(query_vector), dtype=np.float32)
+        if query.shape != (self.dimension,):
+            raise ValueError(
+                f"Expected a query of dimension {self.dimension}, got {query.shape[-1]}"
+            )
+        return query
+
+    def normalise_query(self, query_vector: Iterable[float]) -> np.ndarray:
+        """Return ``query_vector`` as an L2-normalised float32 array of the store's dimension."""
+
+        query = self._as_query(query_vector)
+        norm = float(np.linalg.norm(query))
+        return query / norm if norm > 0 else query
+
+    def _ensure_writable(self) -> None:
+        """Copy memory-mapped buffers into private memory before mutating them."""
+
+        if self._matrix is not None and not self._matrix.flags.writeable:
+            self._matrix = np.array(self._matrix, dtype=np.float32)
+            self._norms = np.array(self._norms, dtype=np.float32)
+
+    def _reserve(self, rows: int, dimension: int) -> None:
+        """Grow the backing buffers geometrically so inserts stay amortised O(d)."""
+
+        if self._matrix is None:
+            capacity = max(self._INITIAL_CAPACITY, rows)
+            self._matrix = np.zeros((capacity, dimension), dtype=np.float32)
+            self._norms = np.zeros(capacity, dtype=np.float32)
+            self._deleted = np.zeros(capacity, dtype=bool)
+            return
+
+        if dimension != self._matrix.shape[1]:
+            raise ValueError(
+                f"Expected a vector of dimension {self._matrix.shape[1]}, got {dimension}"
+            )
+        if rows <= self._matrix.shape[0]:
+            return
+
+        size = len(self._keys)
+        capacity = max(rows, 2 * self._matrix.shape[0])
+        matrix = np.zeros((capacity, dimension), dtype=np.float32)
+        matrix[:size] = self._matrix[:size]
+        norms = np.zeros(capacity, dtype=np.float32)
+        norms[:size] = self._norms[:size]
+        deleted = np.zeros(capacity, dtype=bool)
+        deleted[:size] = self._deleted[:size]
+        self._matrix, self._norms, self._deleted = matrix, norms, deleted
+
 
 if __name__ == "__main__":
     list_of_text = [
@@ -1,15 +1,84 @@
 # Lightweight FastAPI app for Vercel with PDF support
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from openai import OpenAI, AsyncOpenAI
+import asyncio
+import contextlib
 import os
-import tempfile
+import json
+import logging
 import math
-from typing import Optional, List
+import time
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Dict, Optional, List, Tuple
+
+from aimakerspace.document_store import DiskDocumentBackend, DocumentSession, DocumentStore, InMemoryDocumentBackend
+from aimakerspace.lexical import BM25Index
+from aimakerspace.openai_utils.chatmodel import ChatOpenAI
+from aimakerspace.openai_utils.client_pool import AsyncClientPool
+from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.openai_utils.embedding_cache import EmbeddingCache
+from aimakerspace.openai_utils.response_cache import ResponseCache
+from aimakerspace.retrieval import HybridRetriever
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Shared embedding cache so repeated chunks and queries skip the API.
+# Set EMBEDDING_CACHE_PATH to also keep embeddings on disk across restarts.
+embedding_cache = EmbeddingCache(path=os.getenv("EMBEDDING_CACHE_PATH"))
+
+# Uploaded documents are embedded once and kept server-side by document id.
+# Set DOCUMENT_STORE_PATH to share sessions between workers via disk.
+document_store = DocumentStore(
+    backend=(
+        DiskDocumentBackend(os.environ["DOCUMENT_STORE_PATH"])
+        if os.getenv("DOCUMENT_STORE_PATH")
+        else InMemoryDocumentBackend()
+    ),
+    ttl_seconds=float(os.getenv("DOCUMENT_TTL_SECONDS", "3600")),
+)
+
+logger = logging.getLogger(__name__)
+
+# Aggregate latency of streamed chat responses, reported by /api/health
+stream_stats: Dict[str, float] = {
+    "streams": 0,
+    "total_time_to_first_token_ms": 0.0,
+    "max_time_to_first_token_ms": 0.0,
+}
+
+# Answers to repeated (or near-identical) questions about the same retrieved
+# context are served without another completion. RESPONSE_CACHE_SIZE=0 disables it.
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")),
+)
+
+# How often hybrid retrieval answered from BM25 alone, reported by /api/health
+retrieval_stats: Dict[str, int] = {"searches": 0, "lexical_exits": 0}
+
+# Long-lived async OpenAI clients keyed by (hashed) API key, so requests
+# reuse keep-alive connections instead of opening a new pool every time.
+client_pool = AsyncClientPool(
+    max_clients=int(os.getenv("OPENAI_CLIENT_POOL_SIZE", "32")),
+    idle_timeout=float(os.getenv("OPENAI_CLIENT_IDLE_SECONDS", "300")),
+)
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Reap idle pooled clients while running and close them all on shutdown."""
+    reaper = asyncio.create_task(client_pool.run_reaper())
+    try:
+        yield
+    finally:
+        reaper.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await reaper
+        await client_pool.aclose()
 
 # Initialize FastAPI application
-app = FastAPI(title="AI Chat Assistant")
+app = FastAPI(title="AI Chat Assistant", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -28,12 +97,15 @@ class ChatRequest(BaseModel):
     api_key: str
     pdf_chunks: Optional[List[str]] = None
     pdf_filename: Optional[str] = None
+    document_id: Optional[str] = None
+    stream: Optional[bool] = False
 
 class PDFUploadResponse(BaseModel):
     message: str
     filename: str
     chunks_processed: int
     chunks: List[str]
+    document_id: Optional[str] = None
 
 class PDFStatusResponse(BaseModel):
     has_pdf: bool
@@ -41,21 +113,12 @@ class PDFStatusResponse(BaseModel):
     chunks_count: int
     note: str = "PDF processing handled client-side for serverless compatibility"
 
-# Simple text chunking function
-def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
-    """Simple text chunking with overlap."""
-    if len(text) <= chunk_size:
-        return [text]
-    
-    chunks = []
-    step = chunk_size - chunk_overlap
-    
-    for i in range(0, len(text), step):
-        chunk = text[i:i + chunk_size]
-        if chunk.strip():
-            chunks.append(chunk)
-    
-    return chunks
+# Keyword index over client-sent chunks, cached so follow-up questions about
+# the same document do not re-tokenize it
+@lru_cache(maxsize=32)
+def lexical_index(chunks: Tuple[str, ...]) -> BM25Index:
+    """BM25 index used when embeddings are unavailable."""
+    return BM25Index.from_texts(chunks)
 
 # Simple cosine similarity
 def cosine_similarity(a: List[float], b: List[float]) -> float:
@@ -69,42 +132,140 @@ def cosine_similarity(a: List[float], b: List[float]) -> float:
     
     return dot_product / (magnitude_a * magnitude_b)
 
+# Embedding model for one API key: batched, rate-limit aware and backed by
+# the shared embedding cache
+def embedding_model_for(api_key: str) -> EmbeddingModel:
+    """Return an embedding model that uses the pooled client for ``api_key``."""
+    return EmbeddingModel(
+        EMBEDDING_MODEL, api_key=api_key, cache=embedding_cache, async_client=client_pool.get(api_key)
+    )
+
+# Embed texts, sending only embedding cache misses to the API
+async def embed_texts(texts: List[str], api_key: str) -> List[List[float]]:
+    """Return embeddings for ``texts``; newly fetched ones are cached."""
+    return await embedding_model_for(api_key).async_get_embeddings(texts)
+
+# In-flight chunk-embedding tasks by API key digest and chunk list. They
+# outlive the request that started them (the event loop only keeps weak
+# references to tasks) and are shared by follow-up messages with the same
+# key sent before they finish; other keys never share another key's request
+chunk_embedding_tasks: Dict[Tuple[str, Tuple[str, ...]], "asyncio.Task"] = {}
+
+def embed_chunks(chunks: List[str], api_key: str) -> "asyncio.Task":
+    """Return the task embedding ``chunks`` for ``api_key``, starting one if none is running."""
+    key = (client_pool.digest(api_key), tuple(chunks))
+    task = chunk_embedding_tasks.get(key)
+    if task is None:
+        task = asyncio.ensure_future(embed_texts(chunks, api_key))
+        chunk_embedding_tasks[key] = task
+        
+        def finished(task: "asyncio.Task") -> None:
+            chunk_embedding_tasks.pop(key, None)
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning("Chunk embedding failed: %s", task.exception())
+        
+        task.add_done_callback(finished)
+    return task
+
 # Simple vector search
 async def search_similar_chunks(query: str, chunks: List[str], api_key: str, k: int = 3) -> List[str]:
-    """Find most similar chunks using OpenAI embeddings."""
-    try:
-        client = AsyncOpenAI(api_key=api_key)
-        
-        # Get embeddings for query and all chunks
-        all_texts = [query] + chunks
-        response = await client.embeddings.create(
-            input=all_texts,
-            model="text-embedding-3-small"
+    """Find the most relevant chunks with hybrid BM25 + embedding search."""
+    async def dense(query: str, n: int) -> List[Tuple[str, float]]:
+        # The chunks are embedded in a task of their own that is shielded from
+        # the retriever's early exit, so once started it always fills the
+        # embedding cache and later messages only embed the query
+        (query_embedding,), chunk_embeddings = await asyncio.gather(
+            embed_texts([query], api_key),
+            asyncio.shield(embed_chunks(chunks, api_key))
         )
         
-        query_embedding = response.data[0].embedding
-        chunk_embeddings = [item.embedding for item in response.data[1:]]
-        
-        # Calculate similarities
-        similarities = []
-        for i, chunk_embedding in enumerate(chunk_embeddings):
-            similarity = cosine_similarity(query_embedding, chunk_embedding)
-            similarities.append((similarity, chunks[i]))
-        
-        # Sort by similarity and return top k
-        similarities.sort(key=lambda x: x[0], reverse=True)
-        return [chunk for _, chunk in similarities[:k]]
-        
+        # Calculate similarities and return the top n
+        similarities = [
+            (chunk, cosine_similarity(query_embedding, chunk_embedding))
+            for chunk, chunk_embedding in zip(chunks, chunk_embeddings)
+        ]
+        similarities.sort(key=lambda x: x[1], reverse=True)
+        return similarities[:n]
+    
+    lexical = lexical_index(tuple(chunks))
+    try:
+        matches = await HybridRetriever(lexical, dense, stats=retrieval_stats).asearch(query, k)
+    except Exception:
+        # Fallback to BM25 alone when embeddings are unavailable
+        matches = lexical.search(query, k)
+    # With no keyword match keep the first chunks
+    return [chunk for chunk, _ in matches] or chunks[:k]
+
+# Hybrid search over an uploaded document session
+async def search_document(query: str, session: DocumentSession, api_key: str, k: int = 3) -> List[str]:
+    """Find the most relevant stored chunks; only the query is embedded."""
+    embedding_model = embedding_model_for(api_key)
+    
+    async def dense(query: str, n: int) -> List[Tuple[Any, float]]:
+        query_embedding = await embedding_model.async_get_embedding(query)
+        return session.database.search(query_embedding, n)
+    
+    retriever = HybridRetriever(session.lexical_index, dense, stats=retrieval_stats)
+    return [str(chunk) for chunk, _ in await retriever.asearch(query, k)]
+
+# Server-sent events for streamed chat completions
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Format one server-sent event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def stream_chat_events(
+    chat_model: ChatOpenAI,
+    messages: List[Dict[str, str]],
+    started_at: float,
+    on_complete: Optional[Callable[[str], None]] = None,
+) -> AsyncIterator[str]:
+    """Relay completion tokens as SSE ``data`` events, then a ``done`` event with timings.
+
+    ``started_at`` is when the request arrived, so the reported time to
+    first token includes retrieval as well as the upstream model latency.
+    ``on_complete`` receives the full answer once the stream has finished.
+    """
+    first_token_at = None
+    chunks = 0
+    parts: List[str] = []
+    try:
+        async for content in chat_model.astream(messages):
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            chunks += 1
+            parts.append(content)
+            yield sse_event({"content": content})
     except Exception as e:
-        # Fallback to simple text matching
-        query_lower = query.lower()
-        scored_chunks = []
-        for chunk in chunks:
-            score = sum(1 for word in query_lower.split() if word in chunk.lower())
-            scored_chunks.append((score, chunk))
-        
-        scored_chunks.sort(key=lambda x: x[0], reverse=True)
-        return [chunk for _, chunk in scored_chunks[:k]]
+        yield sse_event({"detail": str(e)}, event="error")
+        return
+    
+    if on_complete is not None:
+        on_complete("".join(parts))
+    
+    finished_at = time.perf_counter()
+    metrics = {
+        "time_to_first_token_ms": round((first_token_at - started_at) * 1000, 1) if first_token_at else None,
+        "total_ms": round((finished_at - started_at) * 1000, 1),
+        "chunks": chunks,
+    }
+    if metrics["time_to_first_token_ms"] is not None:
+        stream_stats["streams"] += 1
+        stream_stats["total_time_to_first_token_ms"] += metrics["time_to_first_token_ms"]
+        stream_stats["max_time_to_first_token_ms"] = max(
+            stream_stats["max_time_to_first_token_ms"], metrics["time_to_first_token_ms"]
+        )
+    logger.info("Streamed chat completion: %s", metrics)
+    yield sse_event(metrics, event="done")
+
+async def cached_chat_events(answer: str, started_at: float) -> AsyncIterator[str]:
+    """Send a cached answer in the same SSE shape as a streamed completion."""
+    yield sse_event({"content": answer})
+    elapsed_ms = round((time.perf_counter() - started_at) * 1000, 1)
+    yield sse_event(
+        {"time_to_first_token_ms": elapsed_ms, "total_ms": elapsed_ms, "chunks": 1, "cached": True},
+        event="done"
+    )
 
 # Test endpoint
 @app.get("/api/test")
@@ -121,7 +282,19 @@ async def test_endpoint():
 async def health_check():
     return {
         "status": "ok",
-        "environment": "vercel" if os.getenv("VERCEL") else "local"
+        "environment": "vercel" if os.getenv("VERCEL") else "local",
+        "embedding_cache": embedding_cache.stats(),
+        "openai_clients": {"pooled": len(client_pool), "created": client_pool.created},
+        "streaming": {
+            "streams": stream_stats["streams"],
+            "avg_time_to_first_token_ms": (
+                stream_stats["total_time_to_first_token_ms"] / stream_stats["streams"]
+                if stream_stats["streams"] else None
+            ),
+            "max_time_to_first_token_ms": stream_stats["max_time_to_first_token_ms"],
+        },
+        "retrieval": retrieval_stats,
+        "response_cache": response_cache.stats(),
     }
 
 # PDF Upload endpoint
@@ -138,44 +311,54 @@ async def upload_pdf(file: UploadFile = File(...), api_key: str = Form(...)):
         if len(content) > 4 * 1024 * 1024:
             raise HTTPException(status_code=413, detail="File too large. Maximum 4MB allowed.")
         
-        # Process PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-        
+        # Import the extractor inside the function to handle PyPDF2 import errors gracefully
         try:
-            # Import PyPDF2 inside function to handle import errors gracefully
-            try:
-                import PyPDF2
-            except ImportError:
-                raise HTTPException(status_code=500, detail="PDF processing library not available")
-            
-            # Extract text from PDF
-            with open(temp_file_path, 'rb') as pdf_file:
-                reader = PyPDF2.PdfReader(pdf_file)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-            
+            from aimakerspace.text_utils import DocumentBuffer, TokenTextSplitter, extract_pdf_text
+            from aimakerspace.vectordatabase import VectorDatabase
+        except ImportError:
+            raise HTTPException(status_code=500, detail="PDF processing library not available")
+        
+        # Extract the text from the in-memory upload (large PDFs fan out to a
+        # process pool) and chunk it into token-bounded, sentence-aligned
+        # pieces, held as offsets into one copy of the document. Both run in
+        # a worker thread so the event loop stays responsive
+        def extract_and_split() -> Tuple[str, List[Any]]:
+            text = extract_pdf_text(content)
             if not text.strip():
-                raise HTTPException(status_code=400, detail="Could not extract text from PDF")
-            
-            # Chunk the text
-            chunks = chunk_text(text)
-            
-            if not chunks:
-                raise HTTPException(status_code=400, detail="No text chunks created from PDF")
-            
-            return PDFUploadResponse(
-                message=f"PDF '{file.filename}' processed successfully",
-                filename=file.filename,
-                chunks_processed=len(chunks),
-                chunks=chunks
+                return text, []
+            return text, TokenTextSplitter().split_views(text, DocumentBuffer())
+        
+        loop = asyncio.get_running_loop()
+        text, chunks = await loop.run_in_executor(None, extract_and_split)
+        
+        if not text.strip():
+            raise HTTPException(status_code=400, detail="Could not extract text from PDF")
+        
+        if not chunks:
+            raise HTTPException(status_code=400, detail="No text chunks created from PDF")
+        
+        # Embed the chunks once and keep them server-side; chat requests
+        # then only need to send the document id. If embedding fails the
+        # client can still fall back to sending the chunks.
+        document_id = None
+        try:
+            database = await VectorDatabase(embedding_model_for(api_key)).abuild_from_list(chunks)
+            document_id = await document_store.aput(database, file.filename)
+        except Exception:
+            logger.warning(
+                "Could not store %r as a document session; chat will fall back to sending chunks",
+                file.filename,
+                exc_info=True
             )
-            
-        finally:
-            # Clean up temp file
-            os.unlink(temp_file_path)
+            document_id = None
+        
+        return PDFUploadResponse(
+            message=f"PDF '{file.filename}' processed successfully",
+            filename=file.filename,
+            chunks_processed=len(chunks),
+            chunks=[str(chunk) for chunk in chunks],
+            document_id=document_id
+        )
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
@@ -183,36 +366,57 @@ async def upload_pdf(file: UploadFile = File(...), api_key: str = Form(...)):
 # PDF Status endpoint
 @app.get("/api/pdf-status", response_model=PDFStatusResponse)
 async def pdf_status():
-    """PDF status - stateless architecture."""
+    """PDF status - documents are kept per session, keyed by document id."""
     return PDFStatusResponse(
         has_pdf=False,
         filename="",
         chunks_count=0,
-        note="PDF processing is stateless. Upload PDF and chunks are sent with each chat request."
+        note="Uploaded PDFs are embedded once and referenced by document_id in chat requests."
     )
 
 # Enhanced chat endpoint with PDF RAG support
 @app.post("/api/chat")
 async def chat(request: ChatRequest):
-    """Chat endpoint with optional PDF RAG functionality."""
+    """Chat endpoint with optional PDF RAG functionality.
+
+    With ``stream: true`` the answer is sent as server-sent events: one
+    ``data: {"content": ...}`` event per token batch, then an ``event: done``
+    carrying time-to-first-token and total latency.
+    """
+    started_at = time.perf_counter()
     try:
-        client = OpenAI(api_key=request.api_key)
         
-        # Check if we have PDF chunks for RAG
-        if request.pdf_chunks and len(request.pdf_chunks) > 0:
-            # Find relevant chunks using similarity search
-            relevant_chunks = await search_similar_chunks(
-                request.user_message, 
-                request.pdf_chunks, 
-                request.api_key,
-                k=3
+        session = await document_store.aget(request.document_id) if request.document_id else None
+        if request.document_id and session is None and not request.pdf_chunks:
+            raise HTTPException(
+                status_code=404,
+                detail="Document session expired or not found. Please upload the PDF again."
             )
+        
+        # Check if we have a document session or PDF chunks for RAG
+        context = ""
+        if session is not None or (request.pdf_chunks and len(request.pdf_chunks) > 0):
+            # Find relevant chunks using similarity search
+            if session is not None:
+                relevant_chunks = await search_document(
+                    request.user_message,
+                    session,
+                    request.api_key,
+                    k=3
+                )
+            else:
+                relevant_chunks = await search_similar_chunks(
+                    request.user_message, 
+                    request.pdf_chunks, 
+                    request.api_key,
+                    k=3
+                )
             
             # Build context from relevant chunks
             context = "\n\n".join(relevant_chunks)
             
             # Create enhanced system message
-            pdf_name = request.pdf_filename or "the uploaded document"
+            pdf_name = request.pdf_filename or (session.filename if session else None) or "the uploaded document"
             enhanced_system_message = f"""You are an AI assistant that answers questions based on the provided context from {pdf_name}.
 
 IMPORTANT:
@@ -226,38 +430,93 @@ Context from the document:
 {request.developer_message}"""
             
             # Chat with context
-            response = client.chat.completions.create(
-                model=request.model,
-                messages=[
-                    {"role": "system", "content": enhanced_system_message},
-                    {"role": "user", "content": request.user_message}
-                ],
-                stream=False
-            )
-            
-            return {"content": response.choices[0].message.content}
+            system_message = enhanced_system_message
         
         else:
             # Standard chat without PDF
-            response = client.chat.completions.create(
-                model=request.model,
-                messages=[
-                    {"role": "system", "content": request.developer_message},
-                    {"role": "user", "content": request.user_message}
-                ],
-                stream=False
+            system_message = request.developer_message
+        
+        messages = [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": request.user_message}
+        ]
+        
+        # Reuse an earlier answer for the same API key, model, system prompt,
+        # document and retrieved context. Plain chat (no retrieved context) is
+        # never cached. The query embedding (for near-duplicate questions) is
+        # only used if retrieval already cached it.
+        cached_answer = None
+        cache_scope = None
+        query_embedding = None
+        if context:
+            cache_scope = ResponseCache.scope(
+                request.model,
+                request.developer_message,
+                session.document_id if session else None,
+                context,
+                request.api_key
             )
-            
-            return {"content": response.choices[0].message.content}
+            if embedding_cache.on_disk:
+                query_embedding = await asyncio.get_running_loop().run_in_executor(
+                    None, embedding_cache.get, EMBEDDING_MODEL, request.user_message
+                )
+            else:
+                query_embedding = embedding_cache.get(EMBEDDING_MODEL, request.user_message)
+            cached_answer = response_cache.get(cache_scope, request.user_message, query_embedding)
+        
+        def remember(answer: str) -> None:
+            if cache_scope is not None:
+                response_cache.put(cache_scope, request.user_message, answer, query_embedding)
+        
+        stream_headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        if cached_answer is not None:
+            if request.stream:
+                return StreamingResponse(
+                    cached_chat_events(cached_answer, started_at),
+                    media_type="text/event-stream",
+                    headers=stream_headers
+                )
+            return {"content": cached_answer}
+        
+        client = client_pool.get(request.api_key)
+        if request.stream:
+            chat_model = ChatOpenAI(request.model, api_key=request.api_key, async_client=client)
+            return StreamingResponse(
+                stream_chat_events(chat_model, messages, started_at, on_complete=remember),
+                media_type="text/event-stream",
+                headers=stream_headers
+            )
+        
+        response = await client.chat.completions.create(
+            model=request.model,
+            messages=messages,
+            stream=False
+        )
+        
+        content = response.choices[0].message.content
+        if content:
+            remember(content)
+        return {"content": content}
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# For Vercel deployment - ASGI handler with proper pattern
-from mangum import Mangum
+# Also expose app directly for compatibility
+application = app
 
-# Create the handler in the pattern Vercel expects
-handler = Mangum(app, lifespan="off")
+# For Vercel deployment - ASGI handler with proper pattern. Mangum is only
+# imported when the serverless runtime first looks the handler up, so local
+# servers and cold starts that only need the app skip it.
+def __getattr__(name: str) -> Any:
+    if name == "handler":
+        from mangum import Mangum
+        
+        # Create the handler in the pattern Vercel expects
+        globals()["handler"] = Mangum(app, lifespan="off")
+        return globals()["handler"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Also expose app directly for compatibility
-application = app
\ No newline at end of file
+def __dir__() -> List[str]:
+    return sorted(list(globals()) + ["handler"])
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""Cold-start benchmark for the API entry points.
+
+Each run starts a fresh interpreter (so nothing is cached in ``sys.modules``)
+and measures, for ``app.py``, ``hybrid.py`` and ``minimal.py``:
+
+- import: time to import the module
+- first request: time to serve the first ``GET /api/health`` afterwards
+- process: wall time of the whole child process, interpreter start included
+
+Usage::
+
+    python benchmark_startup.py [--runs 5] [--top 10]
+
+``--top`` also lists the slowest imports of each module (from
+``python -X importtime``), which is where cold-start regressions show up.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+ENTRY_POINTS = ("app", "hybrid", "minimal")
+
+
+def first_asgi_request(app, path):
+    """Send one GET to an ASGI app in-process and return the status code"""
+    async def run():
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": b"", "root_path": "", "headers": [(b"host", b"localhost")],
+            "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+        }
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        await app(scope, receive, send)
+        return next(m["status"] for m in messages if m["type"] == "http.response.start")
+    return asyncio.run(run())
+
+
+def first_handler_request(handler_class, path):
+    """Serve one GET with a BaseHTTPRequestHandler over a local socket"""
+    import http.client
+    import threading
+    from http.server import HTTPServer
+
+    server = HTTPServer(("127.0.0.1", 0), handler_class)
+    server.RequestHandlerClass.log_message = lambda *args: None
+    thread = threading.Thread(target=server.handle_request)
+    thread.start()
+    try:
+        connection = http.client.HTTPConnection(*server.server_address)
+        connection.request("GET", path)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        thread.join()
+        server.server_close()
+
+
+def measure_child(module_name):
+    """Runs inside the fresh interpreter: import the module, then hit it once"""
+    sys.path.insert(0, API_DIR)
+    started = time.perf_counter()
+    module = __import__(module_name)
+    imported = time.perf_counter()
+
+    if hasattr(module, "app"):
+        status = first_asgi_request(module.app, "/api/health")
+    else:
+        status = first_handler_request(module.handler, "/api/health")
+    served = time.perf_counter()
+
+    print(json.dumps({
+        "import_ms": (imported - started) * 1000,
+        "first_request_ms": (served - imported) * 1000,
+        "status": status,
+    }))
+
+
+def run_once(module_name):
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", module_name],
+        cwd=API_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def slowest_imports(module_name, top):
+    """Return the ``top`` (cumulative_ms, package) pairs from ``-X importtime``"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=API_DIR, capture_output=True, text=True, check=True,
+    ).stderr
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        entries.append((int(cumulative) / 1000, name.strip()))
+    return sorted(entries, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start latency of the API entry points.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per entry point")
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest imports")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_child(args.child)
+        return
+
+    print(f"{'entry point':<12} {'import ms':>10} {'first request ms':>17} {'process ms':>11}  status")
+    for module_name in ENTRY_POINTS:
+        results = [run_once(module_name) for _ in range(args.runs)]
+        median = {
+            key: statistics.median(result[key] for result in results)
+            for key in ("import_ms", "first_request_ms", "process_ms")
+        }
+        print(
+            f"{module_name + '.py':<12} {median['import_ms']:>10.1f} "
+            f"{median['first_request_ms']:>17.1f} {median['process_ms']:>11.1f}  {results[-1]['status']}"
+        )
+    print(f"(medians of {args.runs} runs)")
+
+    for module_name in ENTRY_POINTS if args.top else ():
+        print(f"\nSlowest imports for {module_name}.py:")
+        for cumulative_ms, name in slowest_imports(module_name, args.top):
+            print(f"  {cumulative_ms:>8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,129 @@
 """Hybrid solution: PDF RAG functionality using BaseHTTPRequestHandler pattern"""
 
-from http.server import BaseHTTPRequestHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import json
-import tempfile
 import os
 import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+from email.message import Message
 from urllib.parse import urlparse, parse_qs
-import cgi
-import io
+from functools import lru_cache
+
+MAX_UPLOAD_BYTES = 4 * 1024 * 1024  # Vercel request body limit
+
+@lru_cache(maxsize=8)
+def _lexical_index(chunks):
+    """BM25 index over a document's chunks, reused while the function is warm."""
+    from aimakerspace.lexical import BM25Index
+    return BM25Index.from_texts(chunks)
+
+UploadedFile = namedtuple("UploadedFile", ["filename", "content_type", "data"])
+
+
+class MultipartError(ValueError):
+    """Malformed multipart/form-data body"""
+
+
+class UploadTooLarge(MultipartError):
+    """A multipart part exceeded its size limit"""
+
+
+def parse_multipart(stream, content_type, content_length, max_file_size=MAX_UPLOAD_BYTES,
+                    max_field_size=64 * 1024, read_size=64 * 1024):
+    """Incrementally parse a multipart/form-data body read from ``stream``.
+
+    At most ``content_length`` bytes are read, ``read_size`` at a time, and
+    only a window of about one read is buffered while looking for part
+    boundaries. File parts are collected as they arrive and joined once at
+    the end; reading stops with ``UploadTooLarge`` as soon as a file passes
+    ``max_file_size`` (or a plain field ``max_field_size``), before the rest
+    of the body is read. Returns ``(fields, files)`` dictionaries.
+    """
+    header = Message()
+    header["Content-Type"] = content_type
+    boundary = header.get_param("boundary")
+    if header.get_content_type() != "multipart/form-data" or not boundary:
+        raise MultipartError("Content-Type must be multipart/form-data with a boundary")
+    
+    remaining = content_length
+    buffer = bytearray()
+    
+    def fill():
+        """Append the next block of the body to the buffer; False at the end"""
+        nonlocal remaining
+        if remaining <= 0:
+            return False
+        block = stream.read(min(read_size, remaining))
+        if not block:
+            raise MultipartError("Request body ended early")
+        remaining -= len(block)
+        buffer.extend(block)
+        return True
+    
+    def read_until(marker, limit):
+        """Consume and return the bytes before ``marker`` (at most ``limit`` of them)"""
+        while True:
+            index = buffer.find(marker)
+            if index >= 0:
+                value = bytes(buffer[:index])
+                del buffer[:index + len(marker)]
+                return value
+            if len(buffer) > limit + len(marker):
+                raise MultipartError("Multipart headers too large")
+            if not fill():
+                raise MultipartError("Unexpected end of multipart body")
+    
+    delimiter = b"\r\n--" + boundary.encode("latin-1")
+    # Treat the opening boundary like the others by pretending it follows a CRLF
+    buffer.extend(b"\r\n")
+    read_until(delimiter, 64 * 1024)
+    
+    fields, files = {}, {}
+    while True:
+        while len(buffer) < 2 and fill():
+            pass
+        if buffer[:2] == b"--":
+            return fields, files
+        if buffer[:2] != b"\r\n":
+            raise MultipartError("Malformed multipart boundary")
+        del buffer[:2]
+        
+        part = Message()
+        for line in read_until(b"\r\n\r\n", 16 * 1024).decode("latin-1").split("\r\n"):
+            name, _, value = line.partition(":")
+            part[name.strip()] = value.strip()
+        name = part.get_param("name", header="content-disposition")
+        filename = part.get_param("filename", header="content-disposition")
+        limit = max_file_size if filename is not None else max_field_size
+        
+        # Stream the body out of the buffer, holding back just enough bytes to
+        # recognise a delimiter split across two reads
+        pieces, size = [], 0
+        while True:
+            index = buffer.find(delimiter)
+            end = index if index >= 0 else max(0, len(buffer) - len(delimiter) + 1)
+            if end:
+                size += end
+                if size > limit:
+                    raise UploadTooLarge(f"Part {name!r} exceeds {limit} bytes")
+                pieces.append(bytes(buffer[:end]))
+                del buffer[:end]
+            if index >= 0:
+                del buffer[:len(delimiter)]
+                break
+            if not fill():
+                raise MultipartError("Unexpected end of multipart body")
+        
+        data = b"".join(pieces)
+        if name is None:
+            continue
+        if filename is not None:
+            files[name] = UploadedFile(filename, part.get("Content-Type"), data)
+        else:
+            fields[name] = data.decode("utf-8")
+
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
@@ -59,7 +175,9 @@ class handler(BaseHTTPRequestHandler):
     
     def do_OPTIONS(self):
         """Handle CORS preflight"""
+        self.send_response(200)
         self._send_cors_headers()
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
     def _handle_chat(self):
@@ -79,8 +197,9 @@ class handler(BaseHTTPRequestHandler):
             try:
                 import openai
                 
-                # Set API key using v0.x style
-                openai.api_key = data['api_key']
+                # Pass the key per call: the local server handles requests on
+                # several threads, so setting the global openai.api_key races
+                api_key = data['api_key']
                 
                 model = data.get('model', 'gpt-3.5-turbo')
                 developer_message = data.get('developer_message', 'You are a helpful AI assistant.')
@@ -115,7 +234,8 @@ Context from the document:
                             {"role": "system", "content": enhanced_system_message},
                             {"role": "user", "content": user_message}
                         ],
-                        max_tokens=500
+                        max_tokens=500,
+                        api_key=api_key
                     )
                 else:
                     # Standard chat without PDF
@@ -125,7 +245,8 @@ Context from the document:
                             {"role": "system", "content": developer_message},
                             {"role": "user", "content": user_message}
                         ],
-                        max_tokens=500
+                        max_tokens=500,
+                        api_key=api_key
                     )
                 
                 self._send_json_response({
@@ -197,148 +318,197 @@ Context from the document:
                 self._send_error_response(400, "Content-Type must be multipart/form-data")
                 return
             
-            # Read the body
             content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length)
-            
-            # Parse multipart form data
-            import cgi
-            import io
-            
-            # Create a file-like object from the body
-            body_file = io.BytesIO(body)
-            
-            # Parse the multipart data
-            environ = {
-                'REQUEST_METHOD': 'POST',
-                'CONTENT_TYPE': content_type,
-                'CONTENT_LENGTH': str(content_length)
-            }
+            if content_length <= 0:
+                self._send_error_response(411, "Content-Length required")
+                return
+            if content_length > MAX_UPLOAD_BYTES + 64 * 1024:
+                # Leave room for the form fields and part headers
+                self._send_error_response(413, "File too large. Maximum 4MB allowed.")
+                return
             
-            form = cgi.FieldStorage(
-                fp=body_file,
-                environ=environ,
-                headers={'content-type': content_type}
-            )
+            # Stream the multipart body straight off the socket, rejecting
+            # oversized files before the rest of the body is read
+            try:
+                fields, files = parse_multipart(self.rfile, content_type, content_length)
+            except UploadTooLarge:
+                self._send_error_response(413, "File too large. Maximum 4MB allowed.")
+                return
+            except MultipartError as e:
+                self._send_error_response(400, f"Invalid form data: {str(e)}")
+                return
             
             # Extract file and API key
-            if 'file' not in form:
+            if 'file' not in files:
                 self._send_error_response(400, "No file provided")
                 return
                 
-            if 'api_key' not in form:
+            if not fields.get('api_key'):
                 self._send_error_response(400, "No API key provided")
                 return
             
-            file_item = form['file']
-            api_key = form['api_key'].value
+            file_item = files['file']
+            api_key = fields['api_key']
             
             # Validate file
             if not file_item.filename or not file_item.filename.endswith('.pdf'):
                 self._send_error_response(400, "Only PDF files are allowed")
                 return
             
-            # Check file size (4MB limit for Vercel)
-            file_content = file_item.file.read()
-            if len(file_content) > 4 * 1024 * 1024:
-                self._send_error_response(413, "File too large. Maximum 4MB allowed.")
+            file_content = file_item.data
+            
+            # Import the extractor inside the function to handle PyPDF2 import errors gracefully
+            try:
+                from aimakerspace.text_utils import TokenTextSplitter, extract_pdf_text
+            except ImportError:
+                self._send_error_response(500, "PDF processing library not available")
                 return
             
-            # Process PDF
-            import tempfile
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                temp_file.write(file_content)
-                temp_file_path = temp_file.name
+            # Extract text straight from the in-memory upload (large PDFs are
+            # split across a process pool)
+            text = extract_pdf_text(file_content)
             
-            try:
-                # Import PyPDF2 inside function to handle import errors gracefully
-                try:
-                    import PyPDF2
-                except ImportError:
-                    self._send_error_response(500, "PDF processing library not available")
-                    return
-                
-                # Extract text from PDF
-                with open(temp_file_path, 'rb') as pdf_file:
-                    reader = PyPDF2.PdfReader(pdf_file)
-                    text = ""
-                    for page in reader.pages:
-                        text += page.extract_text() + "\n"
-                
-                if not text.strip():
-                    self._send_error_response(400, "Could not extract text from PDF")
-                    return
-                
-                # Chunk the text
-                chunks = self._chunk_text(text)
-                
-                if not chunks:
-                    self._send_error_response(400, "No text chunks created from PDF")
-                    return
-                
-                self._send_json_response({
-                    "message": f"PDF '{file_item.filename}' processed successfully",
-                    "filename": file_item.filename,
-                    "chunks_processed": len(chunks),
-                    "chunks": chunks
-                })
-                
-            finally:
-                # Clean up temp file
-                os.unlink(temp_file_path)
+            if not text.strip():
+                self._send_error_response(400, "Could not extract text from PDF")
+                return
+            
+            # Chunk the text into token-bounded, sentence-aligned pieces
+            chunks = TokenTextSplitter().split(text)
+            
+            if not chunks:
+                self._send_error_response(400, "No text chunks created from PDF")
+                return
+            
+            self._send_json_response({
+                "message": f"PDF '{file_item.filename}' processed successfully",
+                "filename": file_item.filename,
+                "chunks_processed": len(chunks),
+                "chunks": chunks
+            })
             
         except Exception as e:
             self._send_error_response(500, f"PDF upload error: {str(e)}")
     
-    def _chunk_text(self, text, chunk_size=1000, chunk_overlap=200):
-        """Simple text chunking with overlap."""
-        if len(text) <= chunk_size:
-            return [text]
-        
-        chunks = []
-        step = chunk_size - chunk_overlap
-        
-        for i in range(0, len(text), step):
-            chunk = text[i:i + chunk_size]
-            if chunk.strip():
-                chunks.append(chunk)
-        
-        return chunks
-    
     def _simple_similarity_search(self, query, chunks, k=3):
-        """Simple text-based similarity search (fallback when no embeddings)"""
-        query_lower = query.lower()
-        scored_chunks = []
-        
-        for chunk in chunks:
-            # Simple scoring based on word overlap
-            chunk_lower = chunk.lower()
-            score = sum(1 for word in query_lower.split() if word in chunk_lower)
-            scored_chunks.append((score, chunk))
-        
-        # Sort by score and return top k
-        scored_chunks.sort(key=lambda x: x[0], reverse=True)
-        return [chunk for _, chunk in scored_chunks[:k]]
+        """BM25 keyword search (fallback when no embeddings)"""
+        # The index is cached by chunk list, so follow-up questions about the
+        # same document skip tokenization; with no keyword match keep the
+        # first chunks as before
+        matches = _lexical_index(tuple(chunks)).search(query, k)
+        return [chunk for chunk, _ in matches] or chunks[:k]
     
     def _send_json_response(self, data, status_code=200):
         """Send JSON response with CORS headers"""
+        body = json.dumps(data).encode()
         self.send_response(status_code)
         self._send_cors_headers()
         self.send_header('Content-Type', 'application/json')
+        # An explicit length lets HTTP/1.1 clients keep the connection open
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.wfile.write(body)
     
     def _send_error_response(self, status_code, message):
         """Send error response"""
+        body = json.dumps({"detail": message}).encode()
         self.send_response(status_code)
         self._send_cors_headers()
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        # The request body may not have been read, so do not reuse the connection
+        self.send_header('Connection', 'close')
+        self.close_connection = True
         self.end_headers()
-        error_data = {"detail": message}
-        self.wfile.write(json.dumps(error_data).encode())
+        self.wfile.write(body)
     
     def _send_cors_headers(self):
         """Send CORS headers"""
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+
+
+class KeepAliveHandler(handler):
+    """``handler`` speaking HTTP/1.1, so local clients can reuse connections.
+
+    Idle keep-alive connections are closed after ``timeout`` seconds so they
+    do not hold on to a worker forever.
+    """
+    protocol_version = "HTTP/1.1"
+    timeout = 15
+
+
+class LocalServer(ThreadingHTTPServer):
+    """Threaded server for running the hybrid handler outside Vercel.
+
+    Connections are served by a fixed pool of ``max_workers`` threads, with
+    up to ``max_queued`` more waiting for a free worker. Beyond that the
+    server is saturated and new connections get an immediate 503 with
+    ``Retry-After`` instead of piling up, so slow chat completions cannot
+    starve health checks of every thread.
+    """
+
+    def __init__(self, server_address, handler_class=KeepAliveHandler, max_workers=8, max_queued=16):
+        super().__init__(server_address, handler_class)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hybrid")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queued)
+        self.rejected = 0
+    
+    def process_request(self, request, client_address):
+        """Hand the connection to the worker pool, or reject it when saturated"""
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            self._reject(request)
+            return
+        self._executor.submit(self._process_pooled, request, client_address)
+    
+    def _process_pooled(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+    
+    def _reject(self, request):
+        body = json.dumps({"detail": "Server busy, please retry"}).encode()
+        head = (
+            "HTTP/1.1 503 Service Unavailable\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Retry-After: 1\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode()
+        try:
+            request.sendall(head + body)
+        except OSError:
+            pass
+        finally:
+            self.shutdown_request(request)
+    
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=True)
+
+
+def serve(host="127.0.0.1", port=8000, max_workers=8, max_queued=16):
+    """Serve the hybrid handler locally until interrupted."""
+    with LocalServer((host, port), max_workers=max_workers, max_queued=max_queued) as server:
+        print(f"Serving api/hybrid.py on http://{host}:{port} ({max_workers} workers, {max_queued} queued)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Run the hybrid API handler locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=8, help="worker threads")
+    parser.add_argument("--queue", type=int, default=16, help="connections waiting for a worker before 503s")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.queue)
@@ -13,11 +13,13 @@ export default function Home() {
   const [chunksCount, setChunksCount] = useState(0)
   const [uploadError, setUploadError] = useState('')
   const [pdfChunks, setPdfChunks] = useState<string[]>([])  // Store PDF chunks
+  const [documentId, setDocumentId] = useState<string | null>(null)  // Server-side document session
 
-  const handleUploadSuccess = (filename: string, chunksProcessed: number, chunks: string[]) => {
+  const handleUploadSuccess = (filename: string, chunksProcessed: number, chunks: string[], docId: string | null) => {
     setUploadedFile(filename)
     setChunksCount(chunksProcessed)
     setPdfChunks(chunks)  // Store the actual PDF chunks
+    setDocumentId(docId)  // Chat only sends this id when the server kept the document
     setUploadError('')
   }
 
@@ -26,6 +28,7 @@ export default function Home() {
     setUploadedFile('')
     setChunksCount(0)
     setPdfChunks([])  // Clear PDF chunks on error
+    setDocumentId(null)
   }
 
   const handleConfigured = (key: string) => {
@@ -104,6 +107,7 @@ export default function Home() {
                 onConfigured={handleConfigured}
                 pdfChunks={pdfChunks}
                 pdfFilename={uploadedFile}
+                documentId={documentId}
               />
             </div>
           </div>
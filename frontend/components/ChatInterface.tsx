@@ -16,12 +16,14 @@ export default function ChatInterface({
   isConfigured, 
   onConfigured,
   pdfChunks = [],
-  pdfFilename = ''
+  pdfFilename = '',
+  documentId = null
 }: { 
   isConfigured: boolean
   onConfigured: (apiKey: string) => void
   pdfChunks?: string[]
   pdfFilename?: string
+  documentId?: string | null
 }) {
   const [messages, setMessages] = useState<Message[]>([])
   const [input, setInput] = useState('')
@@ -59,21 +61,30 @@ export default function ChatInterface({
 
     try {
       // Use the backend API instead of directly calling OpenAI
-      const response = await fetch('/api/chat', {
+      const sendChat = (includeChunks: boolean) => fetch('/api/chat', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
           developer_message: developerMessage,
-          user_message: input.trim(),
+          user_message: userMessage.content,
           model: model,
           api_key: apiKey,
-          pdf_chunks: pdfChunks.length > 0 ? pdfChunks : null,
+          document_id: documentId || null,
+          pdf_chunks: includeChunks && pdfChunks.length > 0 ? pdfChunks : null,
           pdf_filename: pdfFilename || null
         })
       })
 
+      // With a server-side document session only its id is sent. If the
+      // session has expired (or the server restarted) the backend answers
+      // 404, so retry once with the chunks we still have.
+      let response = await sendChat(!documentId)
+      if (response.status === 404 && documentId && pdfChunks.length > 0) {
+        response = await sendChat(true)
+      }
+
       if (!response.ok) {
         const errorData = await response.json()
         console.error('API Error:', response.status, errorData)